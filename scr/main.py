@@ -11,7 +11,7 @@ from datetime import datetime
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
-from scr.modulos.orquestrador import WarrantOrchestrator, WarrantProcessingResult
+from scr.modulos.orquestrador import WarrantProcessingResult, obter_orquestrador
 from scr.modulos.consulta_DI4 import consultar_subsidios_di4, DI4ConsultaResult
 
 # Configuracao de logging
@@ -71,7 +71,7 @@ def processar_oficio(
 
     try:
         # PASSO 1: Processa com orquestrador
-        orchestrator = WarrantOrchestrator(catalog_path)
+        orchestrator = obter_orquestrador(catalog_path)
         processamento = orchestrator.process_warrant(texto_oficio)
 
         resultado["extracoes"] = {
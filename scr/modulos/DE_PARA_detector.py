@@ -1,9 +1,28 @@
 # de_para_detector.py - NOVO MÓDULO
 
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, TYPE_CHECKING
 from pydantic import BaseModel
 
+if TYPE_CHECKING:
+    from scr.modulos.extract_subsidios import SubsidyMatch
+
+# Padrões que indicam necessidade de DE/PARA (compilados uma vez)
+DE_PARA_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    # Padrões explícitos
+    r'(?:origem\s+e\s+destino|DE[/-]PARA|de\s+para)',
+    r'(?:conta\s+de\s+origem|conta\s+de\s+destino)',
+    r'(?:remetente|destinatário|beneficiário)',
+    r'(?:transferências?\s+(?:para|de|entre))',
+    r'(?:identificação\s+do\s+(?:remetente|destinatário))',
+    r'(?:dados?\s+do\s+(?:favorecido|recebedor))',
+
+    # Padrões contextuais
+    r'(?:incluindo|com|contendo)\s+(?:a\s+)?identificação\s+(?:dos?|das?)\s+(?:envolvidos?|partes?|contas?)',
+    r'(?:discriminando|especificando|detalhando)\s+(?:origem|destino|beneficiário)',
+    r'(?:CPF|CNPJ|nome|razão social)\s+do\s+(?:destinatário|beneficiário|favorecido)'
+]]
+
 class DeParaRequirement(BaseModel):
     """Modelo para requisitos de DE/PARA"""
     requer_de_para: bool
@@ -12,9 +31,10 @@ class DeParaRequirement(BaseModel):
     tipo_de_para: List[str]  # ['conta_origem', 'beneficiario', 'instituicao', etc]
     confidence: float
 
-def detect_de_para_requirements(text: str, subsidios_identificados: List[Dict]) -> DeParaRequirement:
+def detect_de_para_requirements(text: str, subsidios_identificados: Sequence["SubsidyMatch"]) -> DeParaRequirement:
     """
     Detecta se o ofício solicita informações de origem/destino (DE/PARA)
+    (recebe os SubsidyMatch direto, sem model_dump)
     """
     requirement = DeParaRequirement(
         requer_de_para=False,
@@ -24,27 +44,11 @@ def detect_de_para_requirements(text: str, subsidios_identificados: List[Dict])
         confidence=0.0
     )
     
-    # Padrões que indicam necessidade de DE/PARA
-    de_para_patterns = [
-        # Padrões explícitos
-        r'(?:origem\s+e\s+destino|DE[/-]PARA|de\s+para)',
-        r'(?:conta\s+de\s+origem|conta\s+de\s+destino)',
-        r'(?:remetente|destinatário|beneficiário)',
-        r'(?:transferências?\s+(?:para|de|entre))',
-        r'(?:identificação\s+do\s+(?:remetente|destinatário))',
-        r'(?:dados?\s+do\s+(?:favorecido|recebedor))',
-        
-        # Padrões contextuais
-        r'(?:incluindo|com|contendo)\s+(?:a\s+)?identificação\s+(?:dos?|das?)\s+(?:envolvidos?|partes?|contas?)',
-        r'(?:discriminando|especificando|detalhando)\s+(?:origem|destino|beneficiário)',
-        r'(?:CPF|CNPJ|nome|razão social)\s+do\s+(?:destinatário|beneficiário|favorecido)'
-    ]
-    
     evidencias = []
     tipos_identificados = set()
     
-    for pattern in de_para_patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
+    for pattern in DE_PARA_PATTERNS:
+        matches = pattern.finditer(text)
         for match in matches:
             evidencias.append(match.group(0))
             
@@ -75,7 +79,7 @@ def detect_de_para_requirements(text: str, subsidios_identificados: List[Dict])
 def associate_de_para_with_subsidios(
     requirement: DeParaRequirement,
     text: str,
-    subsidios: List[Dict]
+    subsidios: Sequence["SubsidyMatch"]
 ) -> DeParaRequirement:
     """
     Associa requisito de DE/PARA com subsídios específicos
@@ -89,13 +93,13 @@ def associate_de_para_with_subsidios(
     subsidios_com_de_para = []
     
     for subsidio in subsidios:
-        subsidio_nome = subsidio.get('nome_subsidio', '').lower()
-        subsidio_texto = subsidio.get('texto_original', '').lower()
+        subsidio_nome = subsidio.nome_subsidio.lower()
+        subsidio_texto = subsidio.texto_original.lower()
         
         # Verifica se é um subsídio típico de DE/PARA
         if any(palavra in subsidio_nome or palavra in subsidio_texto 
                for palavra in subsidios_tipicos_de_para):
-            subsidios_com_de_para.append(subsidio['subsidio_id'])
+            subsidios_com_de_para.append(subsidio.subsidio_id)
             continue
         
         # Verifica se o DE/PARA está mencionado próximo ao subsídio
@@ -103,12 +107,12 @@ def associate_de_para_with_subsidios(
             # Busca evidência próxima ao subsídio no texto
             pattern = f"{re.escape(subsidio_texto)}[^.]*{re.escape(evidencia)}"
             if re.search(pattern, text, re.IGNORECASE | re.DOTALL):
-                subsidios_com_de_para.append(subsidio['subsidio_id'])
+                subsidios_com_de_para.append(subsidio.subsidio_id)
                 break
     
     # Se não identificou subsídios específicos mas tem DE/PARA, aplica a todos
     if requirement.requer_de_para and not subsidios_com_de_para:
-        subsidios_com_de_para = [s['subsidio_id'] for s in subsidios]
+        subsidios_com_de_para = [s.subsidio_id for s in subsidios]
         requirement.confidence *= 0.7  # Reduz confidence por ser inferência
     
     requirement.subsidios_com_de_para = subsidios_com_de_para
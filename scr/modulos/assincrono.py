@@ -0,0 +1,20 @@
+# assincrono.py
+"""Execução de corrotinas a partir de código síncrono"""
+
+import asyncio
+import concurrent.futures
+
+
+def executar_sincrono(coro):
+    """
+    Roda a corrotina até o fim e devolve o resultado. Sem loop em andamento usa
+    asyncio.run; com loop já rodando (Jupyter/SageMaker), onde asyncio.run
+    levanta RuntimeError, roda num loop próprio em uma thread separada.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
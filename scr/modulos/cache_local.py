@@ -0,0 +1,40 @@
+# cache_local.py
+"""Diretório dos caches em disco (dumps joblib e SQLite das respostas do LLM)"""
+
+import os
+import stat
+
+# Por usuário, fora do /tmp: o dump do matcher é carregado com joblib (pickle),
+# então um arquivo plantado por outro usuário viraria execução de código
+CACHE_DIR = os.getenv(
+    "NOVEMBRO_CACHE_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "novembro")
+)
+
+
+def _do_usuario(st: os.stat_result) -> bool:
+    """Pertence ao usuário atual e não é gravável pelo grupo nem por outros"""
+    getuid = getattr(os, "getuid", None)  # ausente no Windows
+    return (getuid is None or st.st_uid == getuid()) and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def diretorio_cache(caminho: str) -> str:
+    """
+    Cria o diretório (modo 0o700) se não existir e confere o dono.
+
+    Raises:
+        PermissionError: diretório de outro usuário ou gravável por outros
+    """
+    os.makedirs(caminho, mode=0o700, exist_ok=True)
+    if not _do_usuario(os.stat(caminho)):
+        raise PermissionError(f"Diretório de cache {caminho} não pertence ao usuário atual ou é gravável por outros")
+    return caminho
+
+
+def arquivo_confiavel(caminho: str) -> bool:
+    """Arquivo regular (não symlink) do usuário atual, que pode ser carregado"""
+    try:
+        st = os.lstat(caminho)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISREG(st.st_mode) and _do_usuario(st)
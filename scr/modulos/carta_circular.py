@@ -4,6 +4,14 @@ import re
 from typing import List, Optional, Dict
 from pydantic import BaseModel, Field
 
+# Padrões para identificar Carta Circular (compilados uma vez)
+CARTA_CIRCULAR_PATTERNS = [
+    re.compile(r'(?:Carta\s+Circular|CC|C\.C\.)\s*(?:n[º°]?\s*)?(\d+)(?:[/-](\d{2,4}))?', re.IGNORECASE),
+    re.compile(r'(?:conforme|segundo|de acordo com)\s+(?:a\s+)?Carta\s+Circular\s*(?:n[º°]?\s*)?(\d+)', re.IGNORECASE),
+    re.compile(r'CC\s*(\d+)(?:[/-](\d{2,4}))?', re.IGNORECASE)
+]
+APLICA_TODOS_PATTERN = re.compile(r'(?:todos?|demais|listados?|acima|abaixo|seguintes?)', re.IGNORECASE)
+
 class CartaCircular(BaseModel):
     """Modelo para Carta Circular identificada"""
     numero: str
@@ -25,15 +33,8 @@ def extract_carta_circular(text: str, subsidios_identificados: List[str] = None)
     """
     cartas = []
     
-    # Padrões para identificar Carta Circular
-    patterns = [
-        r'(?:Carta\s+Circular|CC|C\.C\.)\s*(?:n[º°]?\s*)?(\d+)(?:[/-](\d{2,4}))?',
-        r'(?:conforme|segundo|de acordo com)\s+(?:a\s+)?Carta\s+Circular\s*(?:n[º°]?\s*)?(\d+)',
-        r'CC\s*(\d+)(?:[/-](\d{2,4}))?'
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
+    for pattern in CARTA_CIRCULAR_PATTERNS:
+        matches = pattern.finditer(text)
         
         for match in matches:
             numero = match.group(1)
@@ -88,17 +89,17 @@ def associate_carta_with_subsidios(
     context = full_text[start:end]
     
     # Verifica se aplica a todos os subsídios
-    if re.search(r'(?:todos?|demais|listados?|acima|abaixo|seguintes?)', context, re.IGNORECASE):
+    if APLICA_TODOS_PATTERN.search(context):
         carta.aplica_todos_subsidios = True
         carta.subsidios_associados = subsidios_list
     else:
         # Tenta identificar subsídios específicos mencionados perto da carta
-        subsidios_proximos = []
-        
-        for subsidio in subsidios_list:
-            # Verifica se o subsídio está mencionado no contexto
-            if subsidio.lower() in context.lower():
-                subsidios_proximos.append(subsidio)
+        # (contexto em minúsculas calculado uma vez, não uma vez por subsídio)
+        context_lower = context.lower()
+        subsidios_proximos = [
+            subsidio for subsidio in subsidios_list
+            if subsidio.lower() in context_lower
+        ]
         
         if subsidios_proximos:
             carta.subsidios_associados = subsidios_proximos
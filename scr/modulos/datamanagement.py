@@ -4,6 +4,9 @@ from typing import List, Optional, Literal
 import re
 import os
 
+# CPF/CNPJ casados em extract_minimal_info_for_lookup só têm dígitos e separadores
+_SEPARADORES_DOC = str.maketrans("", "", "./-")
+
 # 1. Agent de Análise Inicial e Classificação do Input
 # Este é o primeiro agente crítico que determina o que realmente chegou no sistema:
 
@@ -164,11 +167,11 @@ def extract_minimal_info_for_lookup(text: str) -> dict:
     
     # Extrai CPFs
     cpfs = re.findall(r'\d{3}\.?\d{3}\.?\d{3}-?\d{2}', text)
-    info["cpfs"] = [re.sub(r'[^\d]', '', cpf) for cpf in set(cpfs)]
+    info["cpfs"] = [cpf.translate(_SEPARADORES_DOC) for cpf in set(cpfs)]
     
     # Extrai CNPJs
     cnpjs = re.findall(r'\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}', text)
-    info["cnpjs"] = [re.sub(r'[^\d]', '', cnpj) for cnpj in set(cnpjs)]
+    info["cnpjs"] = [cnpj.translate(_SEPARADORES_DOC) for cnpj in set(cnpjs)]
     
     # Tenta extrair nomes (heurística simples)
     # Busca por padrões como "Investigado: NOME COMPLETO"
@@ -13,6 +13,23 @@ class DateExtraction(BaseModel):
     data_normalizada: str  # Formato ISO: YYYY-MM-DD
     tipo: Literal["especifica", "periodo", "relativa"]
     confidence: float
+    period: Optional[dict] = None  # Período já calculado (mês completo para mês/ano)
+
+def _month_period(year: str, month: str, texto_original: str) -> dict:
+    """Período do mês completo (primeiro ao último dia)"""
+    # Calcula último dia do mês
+    if month in ['01', '03', '05', '07', '08', '10', '12']:
+        last_day = '31'
+    elif month in ['04', '06', '09', '11']:
+        last_day = '30'
+    else:  # Fevereiro
+        last_day = '29' if int(year) % 4 == 0 else '28'
+
+    return {
+        "inicio": f"{year}-{month}-01",
+        "fim": f"{year}-{month}-{last_day}",
+        "texto_original": texto_original
+    }
 
 @tool
 def extract_all_dates(text: str) -> List[DateExtraction]:
@@ -70,7 +87,8 @@ def extract_all_dates(text: str) -> List[DateExtraction]:
                 data_original=match.group(0),
                 data_normalizada=f"{year}-{month_num}-01",  # Assume início do mês
                 tipo="periodo",
-                confidence=0.90
+                confidence=0.90,
+                period=_month_period(year, month_num, match.group(0))
             ))
     
     # Extrai períodos relativos (últimos 90 dias)
@@ -98,23 +116,7 @@ def extract_period_from_text(text: str) -> Optional[dict]:
             "texto_original": text
         }
     elif len(dates) == 1 and dates[0].tipo == "periodo":
-        # Se é um mês/ano, considera o mês completo
-        date_parts = dates[0].data_normalizada.split('-')
-        year = date_parts[0]
-        month = date_parts[1]
-        
-        # Calcula último dia do mês
-        if month in ['01', '03', '05', '07', '08', '10', '12']:
-            last_day = '31'
-        elif month in ['04', '06', '09', '11']:
-            last_day = '30'
-        else:  # Fevereiro
-            last_day = '29' if int(year) % 4 == 0 else '28'
-        
-        return {
-            "inicio": f"{year}-{month}-01",
-            "fim": f"{year}-{month}-{last_day}",
-            "texto_original": dates[0].data_original
-        }
+        # Se é um mês/ano, considera o mês completo (já calculado na extração)
+        return dates[0].period
     
     return None
\ No newline at end of file
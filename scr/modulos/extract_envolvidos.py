@@ -6,6 +6,10 @@ from typing import List, Optional, Literal
 from pydantic import BaseModel
 from smolagents import tool
 
+# CPF/CNPJ casados pelos padrões abaixo só têm dígitos e separadores: str.translate
+# remove os separadores sem passar pelo re.sub
+_SEPARADORES_DOC = str.maketrans("", "", "./-")
+
 class InvestigatedParty(BaseModel):
     nome: str
     cpf: Optional[str] = None
@@ -32,7 +36,7 @@ def extract_party_from_line(line: str) -> Optional[dict]:
 
     if cpf_match:
         nome = cpf_match.group(1).strip()
-        cpf = re.sub(r'[^\d]', '', cpf_match.group(2))
+        cpf = cpf_match.group(2).translate(_SEPARADORES_DOC)
         return {
             'party': InvestigatedParty(
                 nome=nome,
@@ -49,7 +53,7 @@ def extract_party_from_line(line: str) -> Optional[dict]:
 
     if cnpj_match:
         nome = cnpj_match.group(1).strip()
-        cnpj = re.sub(r'[^\d]', '', cnpj_match.group(2))
+        cnpj = cnpj_match.group(2).translate(_SEPARADORES_DOC)
         return {
             'party': InvestigatedParty(
                 nome=nome,
@@ -88,7 +92,7 @@ def extract_all_investigated_parties(text: str) -> InvestigatedPartiesExtraction
     cnpj_pattern = r'(\b[A-Z].+?)\s*(?:,\s*)?(?:CNPJ|C\.N\.P\.J\.)[:\s]*(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})'
     
     for nome, cpf in re.findall(cpf_pattern, text):
-        cpf_clean = re.sub(r'[^\d]', '', cpf)
+        cpf_clean = cpf.translate(_SEPARADORES_DOC)
         if cpf_clean not in processed_ids:
             investigados.append(InvestigatedParty(
                 nome=nome.strip(),
@@ -99,7 +103,7 @@ def extract_all_investigated_parties(text: str) -> InvestigatedPartiesExtraction
             processed_ids.add(cpf_clean)
     
     for nome, cnpj in re.findall(cnpj_pattern, text):
-        cnpj_clean = re.sub(r'[^\d]', '', cnpj)
+        cnpj_clean = cnpj.translate(_SEPARADORES_DOC)
         if cnpj_clean not in processed_ids:
             investigados.append(InvestigatedParty(
                 nome=nome.strip(),
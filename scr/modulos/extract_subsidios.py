@@ -2,13 +2,26 @@
 
 
 import re
+import os
+import json
+import hashlib
+import functools
+import orjson
+import sqlite3
+import tempfile
+import threading
+import concurrent.futures
+import joblib
+import numpy as np
 import pandas as pd
+import sklearn
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from smolagents import tool
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from scr.modulos.datas_management import extract_period_from_text
+from scr.modulos.cache_local import CACHE_DIR, arquivo_confiavel, diretorio_cache
 
 ## 6.1 AGENTE VALIDAÇÃO MAS TF-IDF
 
@@ -19,6 +32,7 @@ class SubsidyMatch(BaseModel):
     similarity_score: float
     periodo: Optional[dict] = None  # {"inicio": "01/01/2023", "fim": "31/12/2023"} -> quero tirar do código essa parte
     carta_circular: Optional[str] = None  # Carta Circular associada -> quero tirar do código essa parte
+    requer_de_para: bool = False  # Marcado pelo orquestrador quando o ofício pede DE/PARA
     llm_validated: bool = False  # Se passou por validação LLM -> quero tirar do código essa parte
     llm_confidence: Optional[float] = None  # Confidence do LLM (0-1)
     texto_evidencia: Optional[str] = None  # Frase exata onde foi encontrado
@@ -29,6 +43,7 @@ class SubsidiesExtraction(BaseModel):
     subsidios_solicitados: List[SubsidyMatch]
     total_subsidios: int
     subsidios_nao_identificados: List[str]
+    subsidios_por_envolvido: Optional[dict[str, List[str]]] = None  # chave do envolvido -> IDs (validação conjunta)
 
 class LLMSubsidyValidation(BaseModel):
     """Validação de um subsídio individual pelo LLM"""
@@ -54,13 +69,189 @@ class LLMValidationResult(BaseModel):
     todos_subsidios_capturados: bool  # Se o LLM acredita que pegou tudo
     confidence_geral: float  # Confidence geral da extração (0-1)
     observacoes: Optional[str] = None  # Observações gerais do LLM
+    per_envolvido: dict[str, List[str]] = {}  # chave do envolvido -> IDs solicitados para ele
+
+## 6.0 CACHE DAS RESPOSTAS DO LLM
+# Ofícios quase idênticos (modelos repetidos entre varas) geravam a mesma chamada
+# ao LLM várias vezes. O cache em disco (SQLite) guarda o JSON retornado pela
+# chave sha256(texto | classificação | ids TF-IDF | versão do catálogo | modelo).
+
+LLM_CACHE_PATH = os.getenv("SUBS_LLM_CACHE_PATH", os.path.join(CACHE_DIR, "subs_llm_cache.sqlite"))
+_llm_cache_lock = threading.Lock()
+_llm_cache_conn = None
+
+def _get_llm_cache() -> sqlite3.Connection:
+    """Abre (uma vez por processo) a conexão com o cache SQLite"""
+    global _llm_cache_conn
+    if _llm_cache_conn is None:
+        diretorio_cache(os.path.dirname(os.path.abspath(LLM_CACHE_PATH)))
+        _llm_cache_conn = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        _llm_cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (chave TEXT PRIMARY KEY, resposta TEXT)"
+        )
+    return _llm_cache_conn
+
+def _catalog_version(catalog_df: pd.DataFrame) -> str:
+    """Versão do catálogo: muda sempre que ids, descrições ou exemplos mudam"""
+    colunas = [c for c in ("subsidio_id", "descricao", "exemplos") if c in catalog_df.columns]
+    conteudo = catalog_df[colunas].astype(str).to_csv(index=False)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+def _llm_cache_key(
+    texto_oficio: str,
+    classificacao_llm: dict,
+    tfidf_matches: List[SubsidyMatch],
+    catalog_version: str,
+    model_id: str
+) -> str:
+    """Chave do cache: sha256(texto | classificação | ids dos matches | versão do catálogo | modelo)"""
+    partes = [
+        texto_oficio,
+        json.dumps(classificacao_llm, sort_keys=True, ensure_ascii=False, default=str),
+        json.dumps(sorted(m.subsidio_id for m in tfidf_matches)),
+        catalog_version,
+        model_id,
+    ]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+def _llm_cache_get(chave: str) -> Optional[dict]:
+    with _llm_cache_lock:
+        row = _get_llm_cache().execute(
+            "SELECT resposta FROM llm_cache WHERE chave = ?", (chave,)
+        ).fetchone()
+    return orjson.loads(row[0]) if row else None
+
+def _llm_cache_set(chave: str, resposta: dict) -> None:
+    with _llm_cache_lock:
+        conn = _get_llm_cache()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (chave, resposta) VALUES (?, ?)",
+            (chave, orjson.dumps(resposta).decode())
+        )
+        conn.commit()
+
+## 6.0.1 PROMPT DE VALIDAÇÃO
+# Template montado uma única vez no import; a cada chamada só as variáveis são preenchidas
+
+_PROMPT_VALIDACAO_TEMPLATE = """
+## PERSONA
+    Você é um especialista em análise de ofícios judiciais de quebra de sigilo bancário.
+
+## OBJETIVO
+    Sua tarefa é validar a extração de subsídios (tipos de documentos solicitados) de um ofício.
+
+## OFÍCIO COMPLETO:
+```
+{texto_oficio}
+```
+
+## SUBSÍDIOS JÁ IDENTIFICADOS PELO SISTEMA (TF-IDF):
+{matches_text}
+
+## FRAGMENTOS NÃO IDENTIFICADOS:
+{fragments_text}
+
+## CATÁLOGO DE SUBSÍDIOS DISPONÍVEIS (primeiros 50):
+{catalogo_text}
+
+## CLASSIFICAÇÃO POR LLM PARA CADA UM DOS IDS DOS SUBSÍDIOS (agrupada pela chave de cada envolvido)
+{classificacao_llm}
+ ---
+
+## SUAS TAREFAS:
+
+### 1. VALIDAR MATCHES DO TF-IDF
+Para cada match identificado, responda:
+    - Há termos similares ou contexto indicando solicitação?
+    - Ele realmente faz sentido no contexto do ofício?
+    - Qual é a frase EXATA do ofício onde o subsídio foi mencionado?
+    - A sua localização no texto é depois de termos de solicitação (como por exemplo DETERMINO|SOLICITO|REQUEIRO|OFICIE-SE, ou sinônimos), caso o ofício apresente esses termos? 
+    - Por que você considera que esse match está correto (ou incorreto)?
+    - Ele foi identificado pela *CLASSIFICAÇÃO POR LLM*?
+    - Como essa solicitação poderia ser adicionada aos exemplos do catálogo? (texto curto e genérico)
+
+### 2. IDENTIFICAR SUBSÍDIOS FALTANTES
+    - Há algum subsídio solicitado no ofício que NÃO está na lista de matches?
+    - Se sim, analise o 'trecho_identificado' com a frase exata onde ele aparece e a 'justificativa_agente'
+    - A *CLASSIFICAÇÃO POR LLM* está correta?
+    - Esse subsídio existe no catálogo ou é totalmente novo?
+
+### 3. MAPEAR FRAGMENTOS NÃO IDENTIFICADOS
+    - Os fragmentos não identificados correspondem a algum subsídio do catálogo?
+    - Se sim, qual?
+### 4. CONFERIR SE SUBSÍDIOS PRESENTES NÃO ESTÃO INCLUSOS NA ORIGEM DESTINO 
+    - O trecho o qual o subsídio foi solicitado é um complemento de ORIGEM DESTINO? 
+    - Se sim, analise se ele é apenas uma descrição do conteúdo que pode estar presente dentro de ORIGEM DESTINO ou de fato um subsídio que está sendo a mais de forma mais específica.
+
+### 5. ATRIBUIR OS SUBSÍDIOS A CADA ENVOLVIDO
+    - Para cada chave de envolvido da *CLASSIFICAÇÃO POR LLM*, liste os subsidio_id (validações válidas e subsídios novos com catalogo_id_sugerido) solicitados PARA AQUELE envolvido.
+    - Subsídio pedido para todos os envolvidos entra na lista de todas as chaves; subsídio pedido só para um envolvido entra só na chave dele.
+    
+
+---
+
+## FORMATO DE RESPOSTA (JSON):
+
+Retorne APENAS um objeto JSON válido no seguinte formato:
+
+{{
+  "validacoes": [
+    {{
+      "subsidio_id": "1",
+      "e_valido": true,
+      "confidence": 0.95,
+      "texto_evidencia": "Solicito extratos de conta corrente",
+      "justificativa": "O ofício solicita explicitamente extratos de conta corrente, match correto",
+      "sugestao_exemplo": "extratos de conta corrente;movimentações bancárias"
+    }}
+  ],
+  "subsidios_novos": [
+    {{
+      "texto_solicitacao": "informações sobre cartões corporativos",
+      "texto_evidencia": "Determino o fornecimento de informações sobre cartões corporativos",
+      "catalogo_id_sugerido": "3",
+      "e_subsidio_novo": false,
+      "justificativa": "Corresponde ao subsídio 'Cartão de Crédito' (ID 3) mas com wording diferente"
+    }}
+  ],
+  "per_envolvido": {{
+    "1|12345678900": ["1", "3"]
+  }},
+  "todos_subsidios_capturados": false,
+  "confidence_geral": 0.85,
+  "observacoes": "O ofício solicita 5 subsídios, mas o TF-IDF capturou apenas 3. Identifiquei 2 faltantes."
+}}
+
+## INSTRUÇÕES IMPORTANTES:
+1. Rejeite matches que não fazem sentido
+2. No caso de incerteza, considere o texto **OFÍCIO COMPLETO** para apoiar nas respostas
+3. Extraia a frase EXATA do ofício (não parafraseie)
+4. A sugestão de exemplo deve ser curta e genérica para o catálogo
+5. Se um fragmento não identificado é variante de um subsídio existente, mapeie para o catalogo_id
+6. Confidence deve refletir sua certeza (0.0 = incerto, 1.0 = absoluto)
+7. Retorne APENAS o JSON, sem texto adicional
+"""
+
+_catalog_text_cache = {}
+
+def _catalog_to_text(catalog_df: pd.DataFrame, catalog_version: str) -> str:
+    """Texto dos primeiros 50 subsídios do catálogo para o prompt, em cache por versão"""
+    if catalog_version not in _catalog_text_cache:
+        head = catalog_df.head(50)
+        _catalog_text_cache[catalog_version] = "\n".join(
+            f"- {sid}: {nome} - {desc}"
+            for sid, nome, desc in zip(head['subsidio_id'], head['nome'], head['descricao'])
+        )
+    return _catalog_text_cache[catalog_version]
 
 def validate_subsidies_with_llm(
     texto_oficio: str,
     tfidf_matches: List[SubsidyMatch],
     unmatched_fragments: List[str],
     classificacao_llm: dict[str, dict[str, any]],
-    catalogo_completo: pd.DataFrame
+    catalogo_completo: pd.DataFrame,
+    model=None,
+    catalog_version: Optional[str] = None
 ) -> LLMValidationResult:
     """
     Valida os matches do TF-IDF usando LLM e identifica subsídios faltantes
@@ -73,21 +264,39 @@ def validate_subsidies_with_llm(
         unmatched_fragments: Fragmentos não identificados pelo TF-IDF
         classificacao_llm: resultado JSON do classificador (prévio) com as flag_presenca
         catalogo_completo: DataFrame com catálogo de subsídios
+        model: LiteLLMModel já configurado pelo chamador (ex.: o do orquestrador);
+            se None, usa o modelo padrão do módulo
+        catalog_version: versão do catálogo já calculada (SubsidyMatcher.catalog_version);
+            se None, é calculada aqui
 
     Returns:
         LLMValidationResult com validações e subsídios novos identificados
     """
 
     import logging
-    import json
-    import os
+    import litellm
     logger = logging.getLogger(__name__)
 
-    from smolagents import LiteLLMModel
+    if model is None:
+        from scr.modulos.integracao_smolagents import get_openai_model
+        model = get_openai_model()
 
+    # Consulta o cache antes de pagar uma nova chamada ao LLM
+    if catalog_version is None:
+        catalog_version = _catalog_version(catalogo_completo)
+    cache_key = _llm_cache_key(texto_oficio, classificacao_llm, tfidf_matches, catalog_version, model.model_id)
+    cached = _llm_cache_get(cache_key)
+    if cached is not None:
+        try:
+            validacao = LLMValidationResult(**cached)
+            logger.info("Validação LLM recuperada do cache")
+            return validacao
+        except ValidationError:
+            # Entrada gravada antes da validação no cache: descarta e chama o LLM de novo
+            logger.warning("Validação LLM em cache inválida - ignorando")
 
-    # Processando o json para gerar o texto formatado
-    catalogo_text = load_catalog(catalog_path)
+    # Texto do catálogo (primeiros 50), montado uma vez por versão do catálogo
+    catalogo_text = _catalog_to_text(catalogo_completo, catalog_version)
 
     # Prepara matches do TF-IDF
     matches_text = "\n".join([
@@ -101,107 +310,33 @@ def validate_subsidies_with_llm(
         f"- {frag}" for frag in unmatched_fragments
     ]) if unmatched_fragments else "Nenhum fragmento não identificado"
     
-    response = client.chat.completions.create(
+    prompt = _PROMPT_VALIDACAO_TEMPLATE.format_map({
+        "texto_oficio": texto_oficio,
+        "matches_text": matches_text,
+        "fragments_text": fragments_text,
+        "catalogo_text": catalogo_text,
+        "classificacao_llm": classificacao_llm,
+    })
+
+    # Todos os candidatos vão num único prompt: uma ida ao LLM por ofício
+    response = litellm.completion(
+        model=model.model_id,
+        api_key=getattr(model, "api_key", None),
         messages=[
             {
                 "role": "user",
-                "content": f"""
-                ## PERSONA
-                    Você é um especialista em análise de ofícios judiciais de quebra de sigilo bancário.
-                
-                ## OBJETIVO
-                    Sua tarefa é validar a extração de subsídios (tipos de documentos solicitados) de um ofício.
-
-                ## OFÍCIO COMPLETO:
-                ```
-                {texto_oficio}
-                ```
-                
-                ## SUBSÍDIOS JÁ IDENTIFICADOS PELO SISTEMA (TF-IDF):
-                {matches_text}
-                
-                ## FRAGMENTOS NÃO IDENTIFICADOS:
-                {fragments_text}
-                
-                ## CATÁLOGO DE SUBSÍDIOS DISPONÍVEIS (primeiros 50):
-                {catalogo_text}
-
-                ## CLASSIFICAÇÃO POR LLM PARA CADA UM DOS IDS DOS SUBSÍDIOS
-                {classificacao_llm}
-                 ---
-
-                ## SUAS TAREFAS:
-                
-                ### 1. VALIDAR MATCHES DO TF-IDF
-                Para cada match identificado, responda:
-                    - Há termos similares ou contexto indicando solicitação?
-                    - Ele realmente faz sentido no contexto do ofício?
-                    - Qual é a frase EXATA do ofício onde o subsídio foi mencionado?
-                    - A sua localização no texto é depois de termos de solicitação (como por exemplo DETERMINO|SOLICITO|REQUEIRO|OFICIE-SE, ou sinônimos), caso o ofício apresente esses termos? 
-                    - Por que você considera que esse match está correto (ou incorreto)?
-                    - Ele foi identificado pela *CLASSIFICAÇÃO POR LLM*?
-                    - Como essa solicitação poderia ser adicionada aos exemplos do catálogo? (texto curto e genérico)
-                
-                ### 2. IDENTIFICAR SUBSÍDIOS FALTANTES
-                    - Há algum subsídio solicitado no ofício que NÃO está na lista de matches?
-                    - Se sim, analise o 'trecho_identificado' com a frase exata onde ele aparece e a 'justificativa_agente'
-                    - A *CLASSIFICAÇÃO POR LLM* está correta?
-                    - Esse subsídio existe no catálogo ou é totalmente novo?
-                
-                ### 3. MAPEAR FRAGMENTOS NÃO IDENTIFICADOS
-                    - Os fragmentos não identificados correspondem a algum subsídio do catálogo?
-                    - Se sim, qual?
-                ### 4. CONFERIR SE SUBSÍDIOS PRESENTES NÃO ESTÃO INCLUSOS NA ORIGEM DESTINO 
-                    - O trecho o qual o subsídio foi solicitado é um complemento de ORIGEM DESTINO? 
-                    - Se sim, analise se ele é apenas uma descrição do conteúdo que pode estar presente dentro de ORIGEM DESTINO ou de fato um subsídio que está sendo a mais de forma mais específica.
-                    
-                
-                ---
-
-                ## FORMATO DE RESPOSTA (JSON):
-                
-                Retorne APENAS um objeto JSON válido no seguinte formato:
-                
-                {{
-                  "validacoes": [
-                    {{
-                      "subsidio_id": "1",
-                      "e_valido": true,
-                      "confidence": 0.95,
-                      "texto_evidencia": "Solicito extratos de conta corrente",
-                      "justificativa": "O ofício solicita explicitamente extratos de conta corrente, match correto",
-                      "sugestao_exemplo": "extratos de conta corrente;movimentações bancárias"
-                    }}
-                  ],
-                  "subsidios_novos": [
-                    {{
-                      "texto_solicitacao": "informações sobre cartões corporativos",
-                      "texto_evidencia": "Determino o fornecimento de informações sobre cartões corporativos",
-                      "catalogo_id_sugerido": "3",
-                      "e_subsidio_novo": false,
-                      "justificativa": "Corresponde ao subsídio 'Cartão de Crédito' (ID 3) mas com wording diferente"
-                    }}
-                  ],
-                  "todos_subsidios_capturados": false,
-                  "confidence_geral": 0.85,
-                  "observacoes": "O ofício solicita 5 subsídios, mas o TF-IDF capturou apenas 3. Identifiquei 2 faltantes."
-                }}
-                
-                ## INSTRUÇÕES IMPORTANTES:
-                1. Rejeite matches que não fazem sentido
-                2. No caso de incerteza, considere o texto **OFÍCIO COMPLETO** para apoiar nas respostas
-                3. Extraia a frase EXATA do ofício (não parafraseie)
-                4. A sugestão de exemplo deve ser curta e genérica para o catálogo
-                5. Se um fragmento não identificado é variante de um subsídio existente, mapeie para o catalogo_id
-                6. Confidence deve refletir sua certeza (0.0 = incerto, 1.0 = absoluto)
-                7. Retorne APENAS o JSON, sem texto adicional
-                """
+                "content": prompt
             }
-        ],
-        model="gpt-5"
+        ]
     )
-    result_dict = json.loads(response.choices[0].message.content)
-    return result_dict
+    result_dict = orjson.loads(response.choices[0].message.content)
+    # garante que os 'subsidios_novos' está presente no dicionario
+    result_dict.setdefault('subsidios_novos', [])
+
+    # Valida antes de gravar: resposta malformada levanta aqui e não fica no cache
+    validacao = LLMValidationResult(**result_dict)
+    _llm_cache_set(cache_key, validacao.model_dump())
+    return validacao
 
 class SubsidyMatcher:
     def __init__(self, catalog_df: pd.DataFrame):
@@ -214,25 +349,35 @@ class SubsidyMatcher:
         """
         self.catalog = catalog_df
         
-        # Prepara corpus para TF-IDF
-        corpus = []
-        self.id_mapping = []
-        
-        for idx, row in catalog_df.iterrows():
-            # Combina nome, descrição e exemplos
-            text_representation = f"{row['nome']} {row['descricao']}"
-            if isinstance(row['exemplos'], list):
-                text_representation += " " + " ".join(row['exemplos'])
-            corpus.append(text_representation)
-            self.id_mapping.append(row['subsidio_id'])
+        # Prepara corpus para TF-IDF (coluna a coluna, sem iterar linhas)
+        # Combina nome, descrição e exemplos (lista ou string "a; b")
+        nomes = catalog_df['nome'].astype(str)
+        descricoes = catalog_df['descricao'].astype(str)
+        exemplos = catalog_df['exemplos'].map(
+            lambda x: " ".join(x) if isinstance(x, list) else ("" if pd.isna(x) else str(x))
+        )
+        corpus = (nomes + " " + descricoes + " " + exemplos).str.strip().tolist()
+        self.id_mapping = catalog_df['subsidio_id'].tolist()
+
+        # Arrays NumPy para acesso por índice inteiro no hot path de find_matches
+        self._names = catalog_df['nome'].to_numpy()
+        self._ids = np.asarray(self.id_mapping, dtype=object)
         
         # Cria vetorizador TF-IDF
+        # n-gramas de palavras (1,2) geram ~10x menos features que char_wb (3,5),
+        # acelerando fit/transform; strip_accents aproxima "movimentação"/"movimentacao"
         self.vectorizer = TfidfVectorizer(
-            analyzer='char_wb',
-            ngram_range=(3, 5),
-            lowercase=True
+            analyzer='word',
+            ngram_range=(1, 2),
+            lowercase=True,
+            strip_accents='unicode',
+            sublinear_tf=True,
+            norm='l2'
         )
         self.catalog_vectors = self.vectorizer.fit_transform(corpus)
+
+        # Versão do catálogo (chave do cache do LLM), calculada uma vez por catálogo carregado
+        self.catalog_version = _catalog_version(catalog_df)
     
     def find_matches(self, requested_text: str, threshold: float = 0.3) -> List[SubsidyMatch]:
         """
@@ -249,13 +394,113 @@ class SubsidyMatcher:
         for idx, score in enumerate(similarities):
             if score >= threshold:
                 matches.append({
-                    'subsidio_id': self.id_mapping[idx],
-                    'nome_subsidio': self.catalog.iloc[idx]['nome'],
+                    'subsidio_id': self._ids[idx],
+                    'nome_subsidio': self._names[idx],
                     'similarity_score': float(score)
                 })
         
         return sorted(matches, key=lambda x: x['similarity_score'], reverse=True)
 
+## 6.1.1 MATCHER COMPARTILHADO
+# O SubsidyMatcher era reconstruído (load + fit do TF-IDF) a cada linha. Agora é
+# montado uma vez por versão do catálogo, salvo com joblib em disco e carregado
+# com mmap_mode='r': threads reaproveitam o objeto e processos compartilham as
+# matrizes via mmap em vez de refazer o fit.
+
+# Diretório por usuário (cache_local): só carrega dump do próprio usuário
+MATCHER_CACHE_DIR = os.getenv("SUBS_MATCHER_CACHE_DIR", os.path.join(CACHE_DIR, "joblib_subs"))
+# Versão do SubsidyMatcher/vetorizador no nome do dump: incrementar ao mudar a
+# classe ou os parâmetros do TF-IDF, para não recarregar um pickle antigo
+MATCHER_VERSION = "3"
+_matcher_build_lock = threading.Lock()
+
+def get_subsidy_matcher(catalog_path: str) -> SubsidyMatcher:
+    """Retorna o SubsidyMatcher do catálogo, reaproveitado enquanto o arquivo não mudar"""
+    return _load_subsidy_matcher(catalog_path, os.path.getmtime(catalog_path))
+
+@functools.lru_cache(maxsize=4)
+def _load_subsidy_matcher(catalog_path: str, mtime: float) -> SubsidyMatcher:
+    chave = hashlib.sha256(
+        f"{os.path.abspath(catalog_path)}|{mtime}|{MATCHER_VERSION}|{sklearn.__version__}".encode("utf-8")
+    ).hexdigest()[:16]
+    dump_path = os.path.join(MATCHER_CACHE_DIR, f"matcher_{chave}.joblib")
+
+    # lru_cache não serializa misses concorrentes: o lock evita que threads do
+    # mesmo processo façam o fit e o dump ao mesmo tempo
+    with _matcher_build_lock:
+        # Confere o dono do diretório antes de ler qualquer pickle dele
+        diretorio_cache(MATCHER_CACHE_DIR)
+        if arquivo_confiavel(dump_path):
+            return joblib.load(dump_path, mmap_mode='r')
+        if os.path.lexists(dump_path):
+            import logging
+            logging.getLogger(__name__).warning(
+                f"Dump {dump_path} não pertence ao usuário atual ou é gravável por outros - ignorando"
+            )
+
+        matcher = SubsidyMatcher(load_catalog(catalog_path))
+
+        # Escreve em arquivo temporário único e renomeia: outro processo nunca lê
+        # um dump pela metade nem escreve no mesmo temporário
+        with tempfile.NamedTemporaryFile(dir=MATCHER_CACHE_DIR, suffix=".tmp", delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            joblib.dump(matcher, tmp_path, compress=0)
+            os.replace(tmp_path, dump_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return matcher
+
+# Padrões para encontrar blocos de solicitação (compilados uma vez)
+REQUEST_PATTERNS = [
+    re.compile(r'(?:DETERMINO|SOLICITO|REQUEIRO|OFICIE-SE)(.+?)(?:\n\n|$)', re.IGNORECASE | re.DOTALL),
+    re.compile(r'(?:forneça|disponibilize|informe|apresente)(.+?)(?:\.|;|\n)', re.IGNORECASE | re.DOTALL),
+    re.compile(r'(?:extratos?|saldos?|movimenta[çã][õo]es?)(.+?)(?:\.|;|\n)', re.IGNORECASE | re.DOTALL)
+]
+
+# Separador de itens dentro de um bloco de solicitação
+ITEM_SPLIT_PATTERN = re.compile(r'[;,]|\n-|\n\d+\.')
+
+def _match_request_items(text: str, matcher: SubsidyMatcher, threshold: float) -> List[tuple]:
+    """
+    Percorre os blocos de solicitação e retorna (item, melhor_match ou None)
+    para cada item com mais de 10 caracteres
+    """
+    candidatos = []
+
+    for pattern in REQUEST_PATTERNS:
+        for request_match in pattern.finditer(text):
+            start, end = request_match.span(1)
+            if end - start <= 10:  # Nenhum item caberia no filtro de tamanho abaixo
+                continue
+
+            # Quebra em itens individuais se houver lista
+            for item in ITEM_SPLIT_PATTERN.split(text[start:end]):
+                item = item.strip()
+                if len(item) > 10:  # Ignora fragmentos muito curtos
+                    matches = matcher.find_matches(item, threshold=threshold)
+                    candidatos.append((item, matches[0] if matches else None))
+
+    return candidatos
+
+def _build_subsidy_matches(candidatos: List[tuple]) -> List[SubsidyMatch]:
+    """
+    Monta os SubsidyMatch de uma vez; model_construct pula a validação do
+    pydantic, pois os dados vêm do próprio matcher
+    """
+    return [
+        SubsidyMatch.model_construct(
+            subsidio_id=best_match['subsidio_id'],
+            nome_subsidio=best_match['nome_subsidio'],
+            texto_original=item,
+            similarity_score=best_match['similarity_score'],
+            llm_validated=False
+        )
+        for item, best_match in candidatos
+        if best_match is not None
+    ]
+
 @tool
 def extract_and_match_subsidies(text: str, catalog_path: str) -> SubsidiesExtraction:
     """
@@ -266,41 +511,11 @@ def extract_and_match_subsidies(text: str, catalog_path: str) -> SubsidiesExtrac
     Returns:
         SubsidiesExtraction: Um objeto contendo os subsídios identificados, o total de subsídios e os fragmentos não identificados.
     """
-    catalog_df = pd.read_json(catalog_path)
-    matcher = SubsidyMatcher(catalog_df)
-    
-    # Padrões para encontrar blocos de solicitação
-    request_patterns = [
-        r'(?:DETERMINO|SOLICITO|REQUEIRO|OFICIE-SE)(.+?)(?:\n\n|$)',
-        r'(?:forneça|disponibilize|informe|apresente)(.+?)(?:\.|;|\n)',
-        r'(?:extratos?|saldos?|movimenta[çã][õo]es?)(.+?)(?:\.|;|\n)'
-    ]
-    
-    all_matches = []
-    unmatched = []
-    
-    for pattern in request_patterns:
-        requests = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
-        
-        for request in requests:
-            # Quebra em itens individuais se houver lista
-            items = re.split(r'[;,]|\n-|\n\d+\.', request)
-            
-            for item in items:
-                if len(item.strip()) > 10:  # Ignora fragmentos muito curtos
-                    matches = matcher.find_matches(item.strip())
-                    
-                    if matches:
-                        best_match = matches[0]
-                        
-                        all_matches.append(SubsidyMatch(
-                            subsidio_id=best_match['subsidio_id'],
-                            nome_subsidio=best_match['nome_subsidio'],
-                            texto_original=item.strip(),
-                            similarity_score=best_match['similarity_score'],
-                        ))
-                    else:
-                        unmatched.append(item.strip())
+    matcher = get_subsidy_matcher(catalog_path)
+
+    candidatos = _match_request_items(text, matcher, threshold=0.3)
+    all_matches = _build_subsidy_matches(candidatos)
+    unmatched = [item for item, best_match in candidatos if best_match is None]
     
     return SubsidiesExtraction(
         subsidios_solicitados=all_matches,
@@ -308,11 +523,32 @@ def extract_and_match_subsidies(text: str, catalog_path: str) -> SubsidiesExtrac
         subsidios_nao_identificados=unmatched
     )
 
+# Score TF-IDF acima do qual o match dispensa a validação LLM
+LLM_SKIP_CONFIDENCE = 0.85
+TFIDF_HYBRID_THRESHOLD = 0.20
+
+def _ids_presenca_sim(classificacao_llm: dict) -> set:
+    """
+    IDs marcados com flag_presenca=SIM na classificação prévia
+    Aceita o formato simples {id: {...}} e o agrupado por envolvido {doc: {id: {...}}}
+    """
+    ids = set()
+    for chave, dados in classificacao_llm.items():
+        if not isinstance(dados, dict):
+            continue
+        if 'flag_presenca' in dados:
+            if str(dados.get('flag_presenca', '')).upper() == 'SIM':
+                ids.add(chave)
+        else:
+            ids |= _ids_presenca_sim(dados)
+    return ids
+
 @tool
 def extract_and_match_subsidies_hybrid(
     text: str,
     catalog_path: str,
-    use_llm_validation: bool = True
+    use_llm_validation: bool = True,
+    classificacao_llm: Optional[dict] = None
 ) -> SubsidiesExtraction:
     """
     Extrai subsídios usando TF-IDF + Validação LLM
@@ -331,47 +567,37 @@ def extract_and_match_subsidies_hybrid(
     Returns:
         SubsidiesExtraction com validações LLM incluídas
     """
+    return _extract_subsidies_hybrid(text, catalog_path, use_llm_validation, classificacao_llm)
+
+def _extract_subsidies_hybrid(
+    text: str,
+    catalog_path: str,
+    use_llm_validation: bool = True,
+    classificacao_llm: Optional[dict] = None,
+    candidatos: Optional[list] = None,
+    model=None
+) -> SubsidiesExtraction:
+    """
+    Implementação da extração híbrida. Aceita os candidatos TF-IDF já
+    calculados (estágio em processos de valida_classificacoes) para não
+    refazer a FASE 1 na thread que faz a chamada ao LLM, e o LiteLLMModel do
+    chamador para a validação
+    """
 
     import logging
     logger = logging.getLogger(__name__)
 
-    catalog_df = load_catalog(catalog_path)
-    matcher = SubsidyMatcher(catalog_df)
+    classificacao_llm = classificacao_llm or {}
+    matcher = get_subsidy_matcher(catalog_path)
+    catalog_df = matcher.catalog
 
     logger.info("FASE 1: Extração TF-IDF")
 
-    request_patterns = [
-        r'(?:DETERMINO|SOLICITO|REQUEIRO|OFICIE-SE)(.+?)(?:\n\n|$)',
-        r'(?:forneça|disponibilize|informe|apresente)(.+?)(?:\.|;|\n)',
-        r'(?:extratos?|saldos?|movimenta[çã][õo]es?)(.+?)(?:\.|;|\n)'
-    ]
-
-    all_matches = []
-    unmatched_fragments = []
-
-    for pattern in request_patterns:
-        requests = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
-
-        for request in requests:
-            items = re.split(r'[;,]|\n-|\n\d+\.', request)
-
-            for item in items:
-                if len(item.strip()) > 10:
-                    # Threshold BAIXO (0.50) para pegar mais matches
-                    matches = matcher.find_matches(item.strip(), threshold=0.20)
-
-                    if matches:
-                        best_match = matches[0]
-
-                        all_matches.append(SubsidyMatch(
-                            subsidio_id=best_match['subsidio_id'],
-                            nome_subsidio=best_match['nome_subsidio'],
-                            texto_original=item.strip(),
-                            similarity_score=best_match['similarity_score'],
-                            llm_validated=False  # Ainda não validado
-                        ))
-                    else:
-                        unmatched_fragments.append(item.strip())
+    # Threshold BAIXO (0.20) para pegar mais matches
+    if candidatos is None:
+        candidatos = _match_request_items(text, matcher, threshold=TFIDF_HYBRID_THRESHOLD)
+    all_matches = _build_subsidy_matches(candidatos)  # llm_validated=False: ainda não validados
+    unmatched_fragments = [item for item, best_match in candidatos if best_match is None]
 
     logger.info(f"TF-IDF encontrou {len(all_matches)} matches, {len(unmatched_fragments)} não identificados")
 
@@ -384,6 +610,24 @@ def extract_and_match_subsidies_hybrid(
             subsidios_nao_identificados=unmatched_fragments
         )
 
+    # Atalho: TF-IDF já confiante, sem fragmentos soltos e cobrindo tudo que a
+    # classificação prévia marcou como SIM -> não paga a chamada ao LLM
+    ids_tfidf = {m.subsidio_id for m in all_matches}
+    if (
+        all_matches
+        and not unmatched_fragments
+        and all(m.similarity_score > LLM_SKIP_CONFIDENCE for m in all_matches)
+        and _ids_presenca_sim(classificacao_llm) <= ids_tfidf
+    ):
+        logger.info("TF-IDF com alta confiança: pulando validação LLM")
+        for match in all_matches:
+            match.llm_confidence = match.similarity_score
+        return SubsidiesExtraction(
+            subsidios_solicitados=all_matches,
+            total_subsidios=len(all_matches),
+            subsidios_nao_identificados=[]
+        )
+
     # FASE 2: Validação LLM
     logger.info("FASE 2: Validação LLM de todos os matches")
 
@@ -392,12 +636,10 @@ def extract_and_match_subsidies_hybrid(
         tfidf_matches=all_matches,
         unmatched_fragments=unmatched_fragments,
         classificacao_llm=classificacao_llm,
-        catalogo_completo=catalog_df
+        catalogo_completo=catalog_df,
+        model=model,
+        catalog_version=matcher.catalog_version
     )
-    # garante que os 'subsidios_novos' está presente no dicionario
-        llm_validation_dict['subsidios_novos'] = []
-
-    # converte o dicionário retornado em uma instancia de LLMValidationResult
 
     # FASE 3: Consolidação - aplica validações LLM aos matches
     logger.info("FASE 3: Consolidando resultados TF-IDF + LLM")
@@ -429,139 +671,101 @@ def extract_and_match_subsidies_hybrid(
             logger.warning(f"Match sem validação LLM: {match.nome_subsidio}")
             final_matches.append(match)
             
-            # verifica se há subsídios novos identificados pelo llm 
+    # verifica se há subsídios novos identificados pelo llm 
+
+    if llm_validation.subsidios_novos: # verifica se a lista nao esta vazia
     
-            if llm_validation.subsidios_novos: # verifica se a lista nao esta vazia
-            
-                # Adiciona subsídios NOVOS identificados pelo LLM
-                for novo in llm_validation.subsidios_novos:
-                    if novo.catalogo_id_sugerido:
-                        filtered_df = catalog_df[catalog_df['subsidio_id'] == novo.catalogo_id_sugerido]
-                        if not filtered_df.empty:
-                            catalogo_info =filtered_df.iloc[0]
-            
-                            final_matches.append(SubsidyMatch(
-                                subsidio_id=novo.catalogo_id_sugerido,
-                                # nome_subsidio=catalogo_info['nome'],
-                                # texto_original=novo.texto_solicitacao,
-                                similarity_score=0.0,  # LLM identificou, não TF-IDF
-                                llm_validated=True,
-                                llm_confidence=llm_validation.confidence_geral,
-                                texto_evidencia=novo.texto_evidencia,
-                                justificativa_match=novo.justificativa,
-                                sugestao_exemplo=novo.texto_solicitacao
-                            ))
-                        else:
-                            logger.warning(f"Subsidio ID '{novo.catalogo_id_sugerido}' não encontrado no catálogo.")
-                    else:
-                        # adiciona como novo subsídio sem mapeamento no catalogo
-                        final_matches.append(SubsidyMatch(
-                                subsidio_id"N/A",
-                                nome_subsidio="Novo Subsídio",
-                                # texto_original=novo.texto_solicitacao,
-                                similarity_score=0.0,  # LLM identificou, não TF-IDF
-                                llm_validated=True,
-                                llm_confidence=llm_validation.confidence_geral,
-                                texto_evidencia=novo.texto_evidencia,
-                                justificativa_match=novo.justificativa,
-                                sugestao_exemplo=novo.texto_solicitacao
-                            ))
+        # Adiciona subsídios NOVOS identificados pelo LLM
+        for novo in llm_validation.subsidios_novos:
+            if novo.catalogo_id_sugerido:
+                filtered_df = catalog_df[catalog_df['subsidio_id'] == novo.catalogo_id_sugerido]
+                if not filtered_df.empty:
+                    catalogo_info =filtered_df.iloc[0]
+    
+                    final_matches.append(SubsidyMatch(
+                        subsidio_id=novo.catalogo_id_sugerido,
+                        nome_subsidio=catalogo_info['nome'],
+                        texto_original=novo.texto_solicitacao,
+                        similarity_score=0.0,  # LLM identificou, não TF-IDF
+                        llm_validated=True,
+                        llm_confidence=llm_validation.confidence_geral,
+                        texto_evidencia=novo.texto_evidencia,
+                        justificativa_match=novo.justificativa,
+                        sugestao_exemplo=novo.texto_solicitacao
+                    ))
                 else:
-                    logger.info("Nenhum subsídio novo identificado pelo LLM.")
-                    
+                    logger.warning(f"Subsidio ID '{novo.catalogo_id_sugerido}' não encontrado no catálogo.")
+            else:
+                # adiciona como novo subsídio sem mapeamento no catalogo
+                final_matches.append(SubsidyMatch(
+                        subsidio_id="N/A",
+                        nome_subsidio="Novo Subsídio",
+                        texto_original=novo.texto_solicitacao,
+                        similarity_score=0.0,  # LLM identificou, não TF-IDF
+                        llm_validated=True,
+                        llm_confidence=llm_validation.confidence_geral,
+                        texto_evidencia=novo.texto_evidencia,
+                        justificativa_match=novo.justificativa,
+                        sugestao_exemplo=novo.texto_solicitacao
+                    ))
+        else:
+            logger.info("Nenhum subsídio novo identificado pelo LLM.")
+            
     # Subsídios não identificados = aqueles que o LLM também não conseguiu mapear
-    # converte os objetos SubsidyMatch para dicionários
-    final_matches_dict = [match.model_dump() for match in final_matches]
-
     subsidios_verdadeiramente_nao_identificados = [
         novo.texto_solicitacao for novo in llm_validation.subsidios_novos
         if novo.e_subsidio_novo and not novo.catalogo_id_sugerido
     ]
 
-    # retorna o resutado como um dicionario serializável
-    return {
+    return SubsidiesExtraction(
         subsidios_solicitados=final_matches,
         total_subsidios=len(final_matches),
-        subsidios_nao_identificados=subsidios_verdadeiramente_nao_identificados
-    }
+        subsidios_nao_identificados=subsidios_verdadeiramente_nao_identificados,
+        subsidios_por_envolvido=llm_validation.per_envolvido or None
+    )
 
 
 ## 6.2 carrega o catálogo de sub em dataframe
-### primeira versão da função, por algum motivo a segunda versão não funciona sem a primeira, mas o resultado da segunda é o utilizado
-def load_catalog(catalog_path):
-    with open(catalog_path, 'r') as f:
-        json_data = json.load(f)
-
-    # Transformar a estrutura do JSON em um DataFrame
-    catalog_list = []
-    for id_subsidio, detalhes in json_data["ID_SUBSIDIO"].items():
-        catalog_list.append({
-            "subsidio_id": id_subsidio,
-            "nome": id_subsidio,
-            "descricao": detalhes.get("Descricao", "N/A"),
-            "exemplos": "; ".join(detalhes.get("Termos", []))
-        })
-
-    # Criar DataFrame
-    catalog_df = pd.DataFrame(catalog_list)
-    return catalog_df
 
-
-# Carregar catálogo
+# Caminho padrão do catálogo
 catalog_path = "/home/sagemaker-user/SIMBA/03_12_limpo/data/KB/catalogo_subsidios.json"
-data = pd.read_json(catalog_path)
-catalog_df = load_catalog(catalog_path)
-print(catalog_df.head())        
-
 
 ### segunda versão de load catalog
 
 def load_catalog(catalog_path):
-    with open(catalog_path, 'r') as f:
-        json_data = json.load(f)
+    # orjson faz o parse direto dos bytes; as colunas são montadas sem lista de dicts intermediária
+    with open(catalog_path, 'rb') as f:
+        subsidios = orjson.loads(f.read())["ID_SUBSIDIO"]
 
-    # Transformar a estrutura do JSON em um DataFrame
-    catalog_list = []
-    for id_subsidio, detalhes in json_data["ID_SUBSIDIO"].items():
-        # Substituir '.' por espaço no id_subsidio e formatar como "id_subsidio: descrição"
-        id_formatado = id_subsidio.replace(".", " ")
-        nome_formatado = f"{id_formatado}: {detalhes.get('Descricao', 'N/A')}"
-
-        catalog_list.append({
-            "subsidio_id": id_subsidio,
-            "nome": nome_formatado,  # Formatar como "id_subsidio: descrição"
-            "descricao": detalhes.get("Descricao", "N/A"),
-            "exemplos": "; ".join(detalhes.get("Termos", []))
-        })
+    ids = list(subsidios.keys())
+    descricoes = [detalhes.get("Descricao", "N/A") for detalhes in subsidios.values()]
 
     # Criar DataFrame
-    catalog_df = pd.DataFrame(catalog_list)
+    catalog_df = pd.DataFrame({
+        "subsidio_id": ids,
+        # Substituir '.' por espaço no id_subsidio e formatar como "id_subsidio: descrição"
+        "nome": [f"{id_subsidio.replace('.', ' ')}: {desc}" for id_subsidio, desc in zip(ids, descricoes)],
+        "descricao": descricoes,
+        "exemplos": ["; ".join(detalhes.get("Termos", [])) for detalhes in subsidios.values()]
+    })
     return catalog_df
 
 
-# Carregar catálogo
-catalog_path = "/home/sagemaker-user/SIMBA/03_12_limpo/data/KB/catalogo_subsidios.json"
-data = pd.read_json(catalog_path)
-catalog_df = load_catalog(catalog_path)
-catalog_df
-
-catalog_df.to_excel("/home/sagemaker-user/SIMBA/03_12_limpo/data/SAIDA/17_12_25/catalogo.xlsx")
-
-
 ## 6.3 executa
 
 # Função exec_valida
-def exec_valida(text, catalog_path, classificacao_llm, use_llm_validation):
+def exec_valida(text, catalog_path, classificacao_llm, use_llm_validation, candidatos=None):
     if text and isinstance(text, str) and text.strip() != "":
         try:
             resultados_valida = []
 
             # Extrai e valida subsídios usando o texto do ofício
-            resultado_extracao = extract_and_match_subsidies_hybrid(
+            resultado_extracao = _extract_subsidies_hybrid(
                 text=text,
                 classificacao_llm=classificacao_llm,
                 catalog_path=catalog_path,
-                use_llm_validation=True
+                use_llm_validation=True,
+                candidatos=candidatos
             )
 
             resultados_valida.append({
@@ -574,58 +778,136 @@ def exec_valida(text, catalog_path, classificacao_llm, use_llm_validation):
         return {"status": "texto vazio ou nulo"}
 
 
+def _chave_envolvido_valida(indice: int, envolvido: dict) -> str:
+    """Chave única do envolvido no prompt de validação (posição + documento, que pode vir vazio)"""
+    return f"{indice + 1}|{envolvido.get('cpf_cnpj', '') or 'SEM_DOC'}"
+
+def _validacao_do_envolvido(results_validacao, chave: str, classificacao_envolvido: dict, n_envolvidos: int):
+    """
+    Recorta o resultado da validação conjunta para um envolvido: só os subsídios
+    que o LLM atribuiu à chave dele (per_envolvido). Sem essa atribuição (resposta
+    sem per_envolvido ou validação LLM pulada), usa os IDs marcados com SIM na
+    classificação prévia do próprio envolvido; com um único envolvido, fica tudo.
+    """
+    if not isinstance(results_validacao, list):
+        return results_validacao  # erro / texto vazio: igual para todos
+
+    extracao = results_validacao[0]["resultado_extracao"]
+    por_envolvido = extracao.subsidios_por_envolvido or {}
+    if chave in por_envolvido:
+        ids = set(por_envolvido[chave])
+    elif n_envolvidos == 1:
+        return results_validacao
+    else:
+        ids = _ids_presenca_sim(classificacao_envolvido)
+
+    subsidios = [m for m in extracao.subsidios_solicitados if m.subsidio_id in ids]
+    return [{
+        "resultado_extracao": SubsidiesExtraction(
+            subsidios_solicitados=subsidios,
+            total_subsidios=len(subsidios),
+            subsidios_nao_identificados=extracao.subsidios_nao_identificados
+        )
+    }]
+
 # Função para processar os envolvidos
-def processar_valida(row):
-    catalog_path = "/home/sagemaker-user/SIMBA/03_12_limpo/data/KB/catalogo_subsidios.json"
+def processar_valida(row, candidatos=None):
     texto_base = row.get("texto_limpo", "")        # Obtém o texto base da coluna texto_limpo
     envolvidos = row.get("nome_cpf", {}).get("envolvidos", [])
+    lista_subs = row.get("listaSubs", [{}]) or [{}]
 
-    results_valida = []
+    if not envolvidos:
+        return []
 
-    for envolvido in envolvidos:
-        nome = envolvido.get("nome", "")
-        cpf_cnpj = envolvido.get("cpf_cnpj", "")
-        lista_subs = row.get("listaSubs", [{}])[0].get("subsidios", {})
-
-        text = f"{texto_base}"
-        classificacao_llm = lista_subs
+    # Junta a classificação prévia de todos os envolvidos, indexada por uma chave
+    # única de envolvido (quem não tiver entrada própria na listaSubs usa a
+    # primeira, como antes)
+    subs_por_documento = {
+        sub.get("numero_documento_envolvido"): sub.get("subsidios", {})
+        for sub in lista_subs
+    }
+    subs_padrao = lista_subs[0].get("subsidios", {})
+    chaves = [_chave_envolvido_valida(i, envolvido) for i, envolvido in enumerate(envolvidos)]
+    classificacao_llm = {
+        chave: subs_por_documento.get(envolvido.get("cpf_cnpj", ""), subs_padrao)
+        for chave, envolvido in zip(chaves, envolvidos)
+    }
 
-        # Chama a função exec_valida para cada envolvido
-        results_validacao = exec_valida(text, catalog_path, classificacao_llm, use_llm_validation=True)
+    # Uma única chamada para o ofício: o texto é o mesmo para todos os envolvidos,
+    # e o LLM devolve quais subsídios valem para cada chave (per_envolvido)
+    results_validacao = exec_valida(texto_base, catalog_path, classificacao_llm, use_llm_validation=True,
+                                    candidatos=candidatos)
 
-        # Adiciona o resultado à lista de validações
-        results_valida.append({
-            "numero_documento_envolvido": cpf_cnpj,
+    results_valida = [
+        {
+            "numero_documento_envolvido": envolvido.get("cpf_cnpj", ""),
             "tipo_documento": "",
-            "nome_envolvido": nome,
+            "nome_envolvido": envolvido.get("nome", ""),
             "id_cliente": "",
             "flag_relacionamento": "",
             "produtos": "",
-            "subsidios_validados": results_validacao
-        })
+            "subsidios_validados": _validacao_do_envolvido(
+                results_validacao, chave, classificacao_llm[chave], len(envolvidos)
+            )
+        }
+        for chave, envolvido in zip(chaves, envolvidos)
+    ]
 
     return results_valida
 
 
 ### 6.3.1 executa paralelo
+# Dois estágios: o TF-IDF é CPU-bound e não escala com threads por causa do GIL,
+# então roda em processos (cada um carrega o matcher uma vez via initializer,
+# com as matrizes mapeadas do dump joblib). Só as chamadas ao LLM, que são I/O,
+# ficam no pool de threads.
+
+_worker_matcher = None
+
+def _init_tfidf_worker(catalog_path):
+    global _worker_matcher
+    _worker_matcher = get_subsidy_matcher(catalog_path)
+
+def _tfidf_candidatos(text):
+    if not (text and isinstance(text, str) and text.strip() != ""):
+        return None
+    try:
+        return _match_request_items(text, _worker_matcher, threshold=TFIDF_HYBRID_THRESHOLD)
+    except Exception:
+        # Deixa a thread refazer a FASE 1 e reportar o erro pelo exec_valida
+        return None
 
 def valida_classificacoes(df_temp):
     rows = df_temp.to_dict(orient="records")
+    textos = [row.get("texto_limpo", "") for row in rows]
+
+    # Estágio 1: TF-IDF em processos (só o texto atravessa a fronteira)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        initializer=_init_tfidf_worker,
+        initargs=(catalog_path,)
+    ) as executor:
+        candidatos = list(executor.map(_tfidf_candidatos, textos, chunksize=16))
 
+    # Estágio 2: validação LLM em threads
     with concurrent.futures.ThreadPoolExecutor(max_workers=300) as executor:
-        resultados = list(executor.map(processar_valida, rows))
+        resultados = list(executor.map(processar_valida, rows, candidatos))
 
     df_temp["results_valida"] = resultados
     return df_temp
 
 
-# Processa o DataFrame inteiro em paralelo
-dados = valida_classificacoes(dados)
-
-# Exibe o DataFrame atualizado
-print(dados["results_valida"])
-
 
+if __name__ == "__main__":
+    # Carregar catálogo
+    catalog_df = load_catalog(catalog_path)
+    print(catalog_df.head())
 
+    catalog_df.to_excel("/home/sagemaker-user/SIMBA/03_12_limpo/data/SAIDA/17_12_25/catalogo.xlsx")
 
+    # Processa o DataFrame inteiro em paralelo
+    # (dados: DataFrame com texto_limpo, nome_cpf e listaSubs)
+    # dados = valida_classificacoes(dados)
 
+    # Exibe o DataFrame atualizado
+    # print(dados["results_valida"])
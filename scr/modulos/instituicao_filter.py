@@ -1,14 +1,27 @@
 # Filtro de Instituição Financeira
 # Determina se o ofício é relevante para instituição financeira (Banco X)
 
+import os
 import re
-from typing import List, Optional, Literal
-from pydantic import BaseModel
+import bisect
+import functools
+import concurrent.futures
+import ahocorasick
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
 from smolagents import tool
 
+# Valores aceitos nos campos tipo/tipo_sigilo. Os campos são str (sem Literal, que
+# o pydantic confere a cada objeto); a consistência é checada uma vez na importação
+TIPOS_INSTITUICAO = frozenset({
+    "banco_especifico", "instituicao_financeira", "bacen", "fiscal", "operadora", "policia", "indeterminado"
+})
+TIPOS_SIGILO = frozenset({"bancario", "fiscal", "telefonico", "misto", "indeterminado"})
+
 class InstituicaoMencionada(BaseModel):
     """Instituição mencionada no ofício"""
-    tipo: Literal["banco_especifico", "instituicao_financeira", "bacen", "receita", "operadora", "policia", "outro", "indeterminado"]
+    model_config = ConfigDict(frozen=True)  # Compartilhada pelo cache de filter_by_institution
+    tipo: str  # Um de TIPOS_INSTITUICAO
     nome: Optional[str] = None  # Nome específico se mencionado
     trecho_relevante: str  # Onde foi mencionada
     e_destinatario_direto: bool  # Se é destinatário direto (Oficie-se...)
@@ -16,11 +29,12 @@ class InstituicaoMencionada(BaseModel):
 
 class FiltroInstituicaoResult(BaseModel):
     """Resultado da análise de instituição"""
+    model_config = ConfigDict(frozen=True)  # Compartilhado pelo cache de filter_by_institution
     e_relevante_para_banco: bool  # Se deve ser processado pelo Banco X
     motivo: str  # Por que é ou não relevante
     instituicoes_mencionadas: List[InstituicaoMencionada]
     tem_multiplos_destinatarios: bool
-    tipo_sigilo: Literal["bancario", "fiscal", "telefonico", "misto", "indeterminado"]
+    tipo_sigilo: str  # Um de TIPOS_SIGILO
     trecho_relevante_para_banco: Optional[str] = None  # Só o trecho para o banco (se houver)
     confidence: float
 
@@ -61,7 +75,86 @@ OUTRAS_INSTITUICOES = {
     ]
 }
 
-def detect_institution_blocks(text: str) -> List[dict]:
+assert set(OUTRAS_INSTITUICOES) <= TIPOS_INSTITUICAO
+
+# Padrões sem metacaracteres ('vivo', 'rfb', 'delegacia'...) são literais: vão
+# para um autômato Aho-Corasick, que acha todos numa única passada pelo texto
+_LITERAL_RE = re.compile(r'[\w ]+')
+
+def _is_literal(pattern: str) -> bool:
+    return _LITERAL_RE.fullmatch(pattern) is not None
+
+# Os demais padrões são fundidos numa única alternação com grupos nomeados: cada
+# texto é varrido uma vez e m.lastgroup diz qual tipo de instituição casou
+def _institution_matchers(bancos: List[str]) -> tuple:
+    """Retorna (alternação compilada ou None, autômato dos literais ou None)"""
+    grupos = {'banco': bancos, 'bacen': BACEN_PATTERNS, **OUTRAS_INSTITUICOES}
+
+    automaton = ahocorasick.Automaton()
+    for tipo, patterns in grupos.items():
+        for p in patterns:
+            if _is_literal(p):
+                automaton.add_word(p, tipo)
+    if len(automaton):
+        automaton.make_automaton()
+    else:
+        automaton = None
+
+    alternativas = [
+        f"(?P<{tipo}>{'|'.join(regexes)})"
+        for tipo, patterns in grupos.items()
+        if (regexes := [p for p in patterns if not _is_literal(p)])
+    ]
+    # Sem IGNORECASE: os textos chegam em minúsculas (ver _lower_preservando_offsets)
+    fused_re = re.compile('|'.join(alternativas)) if alternativas else None
+    return fused_re, automaton
+
+INSTITUICOES_MATCHERS = _institution_matchers(BANCOS_CONHECIDOS)
+
+@functools.lru_cache(maxsize=8)
+def _matchers_for_bank(nome_banco: str) -> tuple:
+    """Matchers com o nome real do banco no lugar de 'banco x' (montados uma vez por nome)"""
+    nome = nome_banco.lower()
+    return _institution_matchers([nome if _is_literal(nome) else re.escape(nome), *BANCOS_CONHECIDOS[1:]])
+
+def _tipos_encontrados(texto_lower: str, matchers: tuple, start: int = 0, end: Optional[int] = None) -> set:
+    """Tipos de instituição em texto_lower[start:end], sem copiar o trecho"""
+    if end is None:
+        end = len(texto_lower)
+    fused_re, automaton = matchers
+    tipos = {tipo for _, tipo in automaton.iter(texto_lower, start, end)} if automaton is not None else set()
+    if fused_re is not None:
+        tipos.update(m.lastgroup for m in fused_re.finditer(texto_lower, start, end))
+    return tipos
+
+# Padrões aplicados sobre o texto já em minúsculas (sem IGNORECASE)
+OFICIE_PATTERN = re.compile(
+    r'(?:oficie-se|oficie|expeça-se)[^.]*?(?:ao|à|aos|às)\s+([^.,\n]+?)(?:[,.]|\n)',
+    re.MULTILINE
+)
+NEXT_OFICIE_PATTERN = re.compile(r'oficie-se')
+
+# Os três tipos de sigilo numa única varredura
+SIGILO_PATTERN = re.compile(r'sigilo\s+(?P<tipo>banc[aá]rio|fiscal|telef[oô]nico)')
+SIGILO_CANONICO = {
+    'bancario': 'bancario', 'bancário': 'bancario',
+    'fiscal': 'fiscal',
+    'telefonico': 'telefonico', 'telefônico': 'telefonico',
+}
+assert set(SIGILO_CANONICO.values()) <= TIPOS_SIGILO
+
+def _lower_preservando_offsets(text: str) -> str:
+    """
+    text.lower() garantindo o mesmo tamanho do original, para que os offsets
+    encontrados no texto minúsculo sirvam para fatiar o texto original
+    """
+    text_lower = text.lower()
+    if len(text_lower) == len(text):
+        return text_lower
+    # Raro: algum caractere vira mais de um ao baixar a caixa (ex.: 'İ')
+    return ''.join(ch if len(ch.lower()) != 1 else ch.lower() for ch in text)
+
+def detect_institution_blocks(text: str, text_lower: Optional[str] = None) -> List[dict]:
     """
     Detecta blocos de solicitação por destinatário
 
@@ -69,29 +162,36 @@ def detect_institution_blocks(text: str) -> List[dict]:
     - "Oficie-se ao Banco X..."
     - "Oficie-se à Receita Federal..."
     - "Determino..."
+
+    Os blocos guardam só os offsets (start, end) do trecho no texto; quem
+    precisar do trecho fatia sob demanda
     """
 
+    if text_lower is None:
+        text_lower = _lower_preservando_offsets(text)
+
     blocks = []
 
+    # Posições de todos os "oficie-se" numa única passada (antes o fim do bloco era
+    # procurado re-varrendo a cauda do texto a cada match)
+    oficie_starts = [m.start() for m in NEXT_OFICIE_PATTERN.finditer(text_lower)]
+
     # Padrão 1: "Oficie-se ao/à [instituição]"
-    oficie_pattern = r'(?:OFICIE-SE|OFICIE|EXPEÇA-SE)[^.]*?(?:AO|À|AOS|ÀS)\s+([^.,\n]+?)(?:[,.]|\n)'
-    matches = re.finditer(oficie_pattern, text, re.IGNORECASE | re.MULTILINE)
+    matches = OFICIE_PATTERN.finditer(text_lower)
 
     for match in matches:
-        instituicao = match.group(1).strip()
+        dest_start, dest_end = match.span(1)
+        instituicao = text[dest_start:dest_end].strip()
         start = match.start()
 
         # Encontra o bloco de texto até o próximo "Oficie-se" ou fim
-        next_oficie = re.search(r'OFICIE-SE', text[start+10:], re.IGNORECASE)
-        if next_oficie:
-            end = start + 10 + next_oficie.start()
-        else:
-            end = len(text)
+        i = bisect.bisect_left(oficie_starts, start + 10)
+        end = oficie_starts[i] if i < len(oficie_starts) else len(text)
 
         blocks.append({
             'tipo': 'oficie_se',
             'destinatario': instituicao,
-            'trecho': text[start:end],
+            'destinatario_lower': match.group(1).strip(),
             'start': start,
             'end': end
         })
@@ -102,60 +202,83 @@ def detect_institution_blocks(text: str) -> List[dict]:
         blocks.append({
             'tipo': 'generico',
             'destinatario': 'INDETERMINADO',
-            'trecho': text,
+            'destinatario_lower': 'indeterminado',
             'start': 0,
             'end': len(text)
         })
 
     return blocks
 
-def classify_institution(destinatario: str, trecho: str) -> InstituicaoMencionada:
+def classify_institution(
+    destinatario: str,
+    text: str,
+    start: int = 0,
+    end: Optional[int] = None,
+    matchers: Optional[tuple] = None,
+    dest_lower: Optional[str] = None,
+    text_lower: Optional[str] = None
+) -> InstituicaoMencionada:
     """
-    Classifica o tipo de instituição mencionada
+    Classifica o tipo de instituição mencionada no trecho text[start:end]
+
+    matchers: (alternação, autômato) já montados (padrão: INSTITUICOES_MATCHERS)
+    dest_lower/text_lower: versões em minúsculas já calculadas pelo chamador
+
+    Os campos são montados aqui mesmo (tipos fixos), então usa model_construct
+    e pula a validação do pydantic, que rodaria uma vez por bloco
     """
 
-    dest_lower = destinatario.lower()
-    trecho_lower = trecho.lower()
+    if end is None:
+        end = len(text)
+    if dest_lower is None:
+        dest_lower = destinatario.lower()
+    if text_lower is None:
+        text_lower = _lower_preservando_offsets(text)
+
+    # Uma varredura por texto; a prioridade entre os tipos é mantida abaixo
+    matchers = matchers or INSTITUICOES_MATCHERS
+    tipos_dest = _tipos_encontrados(dest_lower, matchers)
+    tipos_trecho = _tipos_encontrados(text_lower, matchers, start, end)
+
+    # Só o trecho exibido é materializado
+    trecho_relevante = text[start:min(end, start + 200)]
 
     # Verifica bancos
-    for pattern in BANCOS_CONHECIDOS:
-        if re.search(pattern, dest_lower, re.IGNORECASE) or re.search(pattern, trecho_lower, re.IGNORECASE):
-            return InstituicaoMencionada(
-                tipo="banco_especifico" if "banco x" in dest_lower else "instituicao_financeira",
-                nome=destinatario,
-                trecho_relevante=trecho[:200],
-                e_destinatario_direto=True,
-                confidence=0.95
-            )
+    if 'banco' in tipos_dest or 'banco' in tipos_trecho:
+        return InstituicaoMencionada.model_construct(
+            tipo="banco_especifico" if "banco x" in dest_lower else "instituicao_financeira",
+            nome=destinatario,
+            trecho_relevante=trecho_relevante,
+            e_destinatario_direto=True,
+            confidence=0.95
+        )
+
+    # Verifica BACEN (só no destinatário)
+    if 'bacen' in tipos_dest:
+        return InstituicaoMencionada.model_construct(
+            tipo="bacen",
+            nome="BACEN",
+            trecho_relevante=trecho_relevante,
+            e_destinatario_direto=True,
+            confidence=0.95
+        )
 
-    # Verifica BACEN
-    for pattern in BACEN_PATTERNS:
-        if re.search(pattern, dest_lower, re.IGNORECASE):
-            return InstituicaoMencionada(
-                tipo="bacen",
-                nome="BACEN",
-                trecho_relevante=trecho[:200],
+    # Verifica outras instituições
+    for tipo in OUTRAS_INSTITUICOES:
+        if tipo in tipos_dest or tipo in tipos_trecho:
+            return InstituicaoMencionada.model_construct(
+                tipo=tipo,
+                nome=destinatario,
+                trecho_relevante=trecho_relevante,
                 e_destinatario_direto=True,
-                confidence=0.95
+                confidence=0.90
             )
 
-    # Verifica outras instituições
-    for tipo, patterns in OUTRAS_INSTITUICOES.items():
-        for pattern in patterns:
-            if re.search(pattern, dest_lower, re.IGNORECASE) or re.search(pattern, trecho_lower, re.IGNORECASE):
-                return InstituicaoMencionada(
-                    tipo=tipo,
-                    nome=destinatario,
-                    trecho_relevante=trecho[:200],
-                    e_destinatario_direto=True,
-                    confidence=0.90
-                )
-
     # Indeterminado
-    return InstituicaoMencionada(
+    return InstituicaoMencionada.model_construct(
         tipo="indeterminado",
         nome=destinatario,
-        trecho_relevante=trecho[:200],
+        trecho_relevante=trecho_relevante,
         e_destinatario_direto=True,
         confidence=0.5
     )
@@ -172,21 +295,25 @@ def filter_by_institution(text: str, nome_banco: str = "Banco X") -> FiltroInsti
     Returns:
         FiltroInstituicaoResult com análise de relevância
     """
+    return _filter_impl(text, nome_banco)
 
+# O mesmo texto chega várias vezes (e-mails encaminhados, reprocessamentos); o
+# resultado só depende de (text, nome_banco), então é memoizado. maxsize limita
+# a memória em lotes grandes
+@functools.lru_cache(maxsize=512)
+def _filter_impl(text: str, nome_banco: str) -> FiltroInstituicaoResult:
     import logging
     logger = logging.getLogger(__name__)
 
-    # Atualiza padrões com nome real do banco
-    global BANCOS_CONHECIDOS
-    BANCOS_CONHECIDOS = [
-        nome_banco.lower(),
-        r'bancos?',
-        r'institui[çc][aã]o\s+financeira',
-        r'institui[çc][õo]es\s+financeiras',
-    ]
+    # Padrões com nome real do banco, montados por chamada (sem alterar o global,
+    # então ofícios processados em paralelo não interferem entre si)
+    matchers = _matchers_for_bank(nome_banco)
+
+    # Caixa baixa uma única vez; blocos, classificação e sigilo usam este buffer
+    text_lower = _lower_preservando_offsets(text)
 
     # PASSO 1: Detecta blocos por destinatário
-    blocks = detect_institution_blocks(text)
+    blocks = detect_institution_blocks(text, text_lower)
     logger.info(f"Detectados {len(blocks)} blocos de solicitação")
 
     # PASSO 2: Classifica cada bloco
@@ -194,35 +321,24 @@ def filter_by_institution(text: str, nome_banco: str = "Banco X") -> FiltroInsti
     trechos_relevantes = []
 
     for block in blocks:
-        inst = classify_institution(block['destinatario'], block['trecho'])
+        inst = classify_institution(
+            block['destinatario'], text, block['start'], block['end'], matchers,
+            dest_lower=block['destinatario_lower'], text_lower=text_lower
+        )
         instituicoes.append(inst)
 
         # Se é relevante para banco, guarda o trecho
         if inst.tipo in ["banco_especifico", "instituicao_financeira", "indeterminado"]:
-            trechos_relevantes.append(block['trecho'])
+            trechos_relevantes.append(text[block['start']:block['end']])
 
     # PASSO 3: Detecta tipo de sigilo
-    tipo_sigilo = "indeterminado"
-    text_lower = text.lower()
-
-    if re.search(r'sigilo\s+banc[aá]rio', text_lower):
-        tipo_sigilo = "bancario"
-    elif re.search(r'sigilo\s+fiscal', text_lower):
-        tipo_sigilo = "fiscal"
-    elif re.search(r'sigilo\s+telef[oô]nico', text_lower):
-        tipo_sigilo = "telefonico"
-
-    # Se menciona múltiplos tipos
-    tipos_mencionados = []
-    if re.search(r'sigilo\s+banc[aá]rio', text_lower):
-        tipos_mencionados.append('bancario')
-    if re.search(r'sigilo\s+fiscal', text_lower):
-        tipos_mencionados.append('fiscal')
-    if re.search(r'sigilo\s+telef[oô]nico', text_lower):
-        tipos_mencionados.append('telefonico')
+    tipos_mencionados = {SIGILO_CANONICO[m.group('tipo')] for m in SIGILO_PATTERN.finditer(text_lower)}
 
+    # Nenhum -> indeterminado; um -> ele mesmo; múltiplos tipos -> misto
     if len(tipos_mencionados) > 1:
         tipo_sigilo = "misto"
+    else:
+        tipo_sigilo = next(iter(tipos_mencionados), "indeterminado")
 
     # PASSO 4: Decide se é relevante
     e_relevante = False
@@ -277,7 +393,7 @@ def filter_by_institution(text: str, nome_banco: str = "Banco X") -> FiltroInsti
         # Assume ofício inteiro
         trecho_final = text
 
-    return FiltroInstituicaoResult(
+    return FiltroInstituicaoResult.model_construct(
         e_relevante_para_banco=e_relevante,
         motivo=motivo,
         instituicoes_mencionadas=instituicoes,
@@ -287,6 +403,29 @@ def filter_by_institution(text: str, nome_banco: str = "Banco X") -> FiltroInsti
         confidence=confidence
     )
 
+# Abaixo disso o custo de subir os processos domina; roda no próprio processo
+FILTER_BATCH_MIN_PROCESSOS = 256
+
+def filter_batch(
+    texts: List[str],
+    nome_banco: str = "Banco X",
+    max_workers: Optional[int] = None
+) -> List[FiltroInstituicaoResult]:
+    """
+    Aplica o filtro de instituição a um lote de textos (reprocessamento em massa)
+
+    A varredura é CPU-bound (regex + autômato) e não escala com threads; lotes
+    grandes são divididos entre processos, cada um com seus matchers já montados.
+    Retorna os resultados na mesma ordem dos textos.
+    """
+    if len(texts) < FILTER_BATCH_MIN_PROCESSOS:
+        return [_filter_impl(text, nome_banco) for text in texts]
+
+    max_workers = max_workers or os.cpu_count()
+    chunksize = max(1, len(texts) // (max_workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_filter_impl, texts, [nome_banco] * len(texts), chunksize=chunksize))
+
 def validate_with_llm_if_ambiguous(
     filtro_result: FiltroInstituicaoResult,
     texto_oficio: str
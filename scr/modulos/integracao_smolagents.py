@@ -1,17 +1,15 @@
 # 8. Integracao com Smolagents - Configuracao Completa
 # Usando apenas OpenAI 5 (o5) como modelo
 
-from smolagents import CodeAgent, ManagedAgent, LiteLLMModel
 from datetime import datetime
+import asyncio
 import logging
 import json
 import os
+import functools
 
-# Importa tools
-from scr.modulos.datamanagement import analyze_input_structure, extract_minimal_info_for_lookup, extract_oficio_content
-from scr.modulos.extract_envolvidos import extract_all_investigated_parties
-from scr.modulos.extract_subsidios import extract_and_match_subsidies
-from scr.modulos.datas_management import extract_all_dates, extract_period_from_text
+# smolagents/litellm e os modulos de tools sao pesados de importar; ficam dentro
+# de get_openai_model e do construtor para que importar este modulo seja barato
 
 # Configuracao de logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +22,13 @@ def get_openai_model():
     """
     model_id = os.getenv("OPENAI_MODEL", "o4-mini")  # OpenAI 5
     api_key = os.getenv("OPENAI_API_KEY")
+    return _build_model(model_id, api_key)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_model(model_id, api_key):
+    # Um modelo por configuracao: os agentes compartilham o mesmo cliente HTTP
+    from smolagents import LiteLLMModel
 
     if api_key:
         return LiteLLMModel(model_id=model_id, api_key=api_key)
@@ -33,11 +38,21 @@ def get_openai_model():
 
 class MultiAgentWarrantProcessor:
     def __init__(self, catalog_path: str):
+        from smolagents import CodeAgent, ManagedAgent
+
+        # Importa tools
+        from scr.modulos.datamanagement import analyze_input_structure, extract_minimal_info_for_lookup, extract_oficio_content
+        from scr.modulos.extract_envolvidos import extract_all_investigated_parties
+        from scr.modulos.extract_subsidios import extract_and_match_subsidies
+        from scr.modulos.datas_management import extract_all_dates, extract_period_from_text
 
         # Configuracao de modelo - APENAS OpenAI 5
         self.model = get_openai_model()
 
-        # Agentes especializados - todos usando OpenAI 5
+        # Agentes especializados - todos usando OpenAI 5. Cada processador tem os
+        # seus (CodeAgent guarda memoria e passos da execucao), entao processadores
+        # nao sao compartilhados entre chamadas concorrentes; so o modelo e o
+        # cliente HTTP sao, via get_openai_model (memoizado em _build_model)
         self.agents = {
             'classifier': CodeAgent(
                 tools=[analyze_input_structure, extract_minimal_info_for_lookup],
@@ -131,6 +146,58 @@ class MultiAgentWarrantProcessor:
                 "requires_manual": True
             }
 
+    async def process_async(self, input_text: str) -> dict:
+        """
+        Processa o texto chamando os agentes diretamente, sem o manager.
+
+        Classificacao e extracao de conteudo rodam em sequencia; partes,
+        subsidios e datas dependem so do conteudo extraido e sao disparados
+        em paralelo (cada agent.run e uma ida e volta ao LLM, entao o tempo
+        total passa a ser o do mais lento em vez da soma)
+        """
+        try:
+            logger.info(f"Iniciando processamento de warrant (agentes em paralelo)")
+
+            classificacao = await asyncio.to_thread(
+                self.agents['classifier'].run,
+                f"Classifique o tipo de conteudo do texto abaixo e se e primeiro oficio ou reiteracao.\n\nTexto:\n{input_text}"
+            )
+            conteudo = await asyncio.to_thread(
+                self.agents['content_extractor'].run,
+                f"Extraia o conteudo do oficio do texto abaixo.\n\nTexto:\n{input_text}"
+            )
+
+            partes, subsidios, datas = await asyncio.gather(
+                asyncio.to_thread(
+                    self.agents['party_extractor'].run,
+                    f"Identifique todos os investigados (sem limite de quantidade).\n\nTexto:\n{conteudo}"
+                ),
+                asyncio.to_thread(
+                    self.agents['subsidy_matcher'].run,
+                    f"Identifique todos os subsidios solicitados (catalogo em {self.catalog_path}).\n\nTexto:\n{conteudo}"
+                ),
+                asyncio.to_thread(
+                    self.agents['date_extractor'].run,
+                    f"Identifique todas as datas/periodos mencionados.\n\nTexto:\n{conteudo}"
+                ),
+            )
+
+            return self._structure_result({
+                "classificacao": classificacao,
+                "conteudo": conteudo,
+                "investigados": partes,
+                "subsidios": subsidios,
+                "datas": datas
+            })
+
+        except Exception as e:
+            logger.error(f"Erro no processamento: {str(e)}")
+            return {
+                "status": "ERRO",
+                "error": str(e),
+                "requires_manual": True
+            }
+
     def _structure_result(self, raw_result):
         """
         Estrutura o resultado bruto em formato padronizado
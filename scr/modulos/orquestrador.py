@@ -1,11 +1,18 @@
 # 6. Orchestrator Agent Principal
 # Coordena todo o fluxo considerando os cenarios possiveis:
 
+import re
 import uuid
-from typing import List, Optional, Literal
+import logging
+import asyncio
+import hashlib
+import functools
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, List, Optional, Literal, Tuple, Union
 from pydantic import BaseModel
-from smolagents import CodeAgent, LiteLLMModel
-import os
+from smolagents import CodeAgent
 
 # Importa funcoes e classes dos outros modulos
 from scr.modulos.datamanagement import (
@@ -21,15 +28,23 @@ from scr.modulos.extract_envolvidos import (
 from scr.modulos.extract_subsidios import (
     SubsidyMatch,
     extract_and_match_subsidies,
-    extract_and_match_subsidies_hybrid  # NOVA versao com validacao LLM
+    extract_and_match_subsidies_hybrid,  # NOVA versao com validacao LLM
+    _extract_subsidies_hybrid
 )
-from scr.modulos.datas_management import (
-    extract_all_dates,
-    extract_period_from_text
+from scr.modulos.datas_management import extract_all_dates
+from scr.modulos.carta_circular import (
+    CartaCircularExtraction,
+    CARTA_CIRCULAR_PATTERNS,
+    extract_carta_circular
+)
+from scr.modulos.DE_PARA_detector import (
+    DeParaRequirement,
+    DE_PARA_PATTERNS,
+    detect_de_para_requirements
 )
-from scr.modulos.carta_circular import extract_carta_circular
-from scr.modulos.DE_PARA_detector import detect_de_para_requirements
 from scr.modulos.instituicao_filter import filter_by_institution, FiltroInstituicaoResult
+from scr.modulos.integracao_smolagents import get_openai_model
+from scr.modulos.assincrono import executar_sincrono
 
 # CCS REMOVIDO - Tool nao disponivel no momento
 # from scr.modulos.ccs_validation import (
@@ -38,6 +53,79 @@ from scr.modulos.instituicao_filter import filter_by_institution, FiltroInstitui
 #     CCSValidationResult
 # )
 
+logger = logging.getLogger(__name__)
+
+# Reprocessamentos/retentativas mandam o mesmo texto de novo; a classificacao
+# (STEP 1) e guardada por digest do texto. O filtro de instituicao (STEP 2.5) ja
+# tem cache proprio em instituicao_filter. A chave e so o digest (o texto nao fica
+# em memoria) e cada chamador recebe uma copia, nunca a instancia do cache
+CLASSIFICACAO_CACHE_MAX = 512
+_classificacoes = OrderedDict()
+_classificacoes_lock = threading.Lock()
+
+def _cached_classification(text: str) -> InputClassification:
+    chave = _text_hash(text)
+    with _classificacoes_lock:
+        classification = _classificacoes.get(chave)
+        if classification is not None:
+            _classificacoes.move_to_end(chave)
+            return classification.model_copy(deep=True)
+
+    classification = analyze_input_structure(text)
+
+    with _classificacoes_lock:
+        _classificacoes[chave] = classification
+        _classificacoes.move_to_end(chave)
+        if len(_classificacoes) > CLASSIFICACAO_CACHE_MAX:
+            _classificacoes.popitem(last=False)
+    return classification.model_copy(deep=True)
+
+def _text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+# Varredura unica: todos os padroes de Carta Circular (grupo cc) e de DE/PARA (grupo
+# dp) numa so alternancia. A maioria dos oficios nao cita nenhum dos dois; nesse caso
+# o texto e percorrido uma vez em vez de uma vez por padrao (12 no total)
+_CARTA_DE_PARA_SCAN = re.compile(
+    "(?P<cc>" + "|".join(p.pattern for p in CARTA_CIRCULAR_PATTERNS) + ")"
+    "|(?P<dp>" + "|".join(p.pattern for p in DE_PARA_PATTERNS) + ")",
+    re.IGNORECASE
+)
+
+def scan_carta_and_de_para(text: str, subsidios: List[SubsidyMatch]):
+    """
+    Detecta Carta Circular e DE/PARA com uma varredura do texto; so roda o
+    extrator detalhado do tipo que apareceu.
+    Retorna (CartaCircularExtraction, DeParaRequirement).
+    """
+    encontrados = set()
+    # Sem subsidios nao ha a quem associar Carta Circular nem DE/PARA: nem varre
+    if subsidios:
+        for match in _CARTA_DE_PARA_SCAN.finditer(text):
+            encontrados.add(match.lastgroup)
+            if len(encontrados) == 2:
+                break
+
+    if "cc" in encontrados:
+        carta_result = extract_carta_circular(text, [s.nome_subsidio for s in subsidios])
+    else:
+        carta_result = CartaCircularExtraction(cartas_encontradas=[], total_cartas=0, tem_carta_circular=False)
+
+    if "dp" in encontrados:
+        de_para = detect_de_para_requirements(text, subsidios)
+    else:
+        de_para = DeParaRequirement(
+            requer_de_para=False,
+            subsidios_com_de_para=[],
+            texto_evidencia=[],
+            tipo_de_para=[],
+            confidence=0.0
+        )
+
+    return carta_result, de_para
+
+# Montado internamente a partir de modelos ja validados (classificacao, investigados,
+# subsidios); por isso os retornos usam model_construct, sem revalidar as listas aninhadas
 class WarrantProcessingResult(BaseModel):
     session_id: str
     input_classification: InputClassification
@@ -51,19 +139,20 @@ class WarrantProcessingResult(BaseModel):
     confidence_geral: float
     alertas: List[str]
 
+    def to_json(self) -> bytes:
+        """
+        Serializa o resultado (com investigados/subsidios aninhados) direto para
+        bytes UTF-8 pelo serializador Rust do pydantic, sem passar por dicts
+        """
+        return self.__pydantic_serializer__.to_json(self)
+
 class WarrantOrchestrator(CodeAgent):
     def __init__(self, catalog_path: str):
         self.catalog_path = catalog_path
 
-        # Configura modelo OpenAI 5 (o5)
-        model_id = os.getenv("OPENAI_MODEL", "o4-mini")  # OpenAI 5 / o5
-        api_key = os.getenv("OPENAI_API_KEY")
-
-        if api_key:
-            model = LiteLLMModel(model_id=model_id, api_key=api_key)
-        else:
-            # Fallback sem API key configurada
-            model = LiteLLMModel(model_id=model_id)
+        # Configura modelo OpenAI 5 (o5) - um LiteLLMModel por (OPENAI_MODEL, OPENAI_API_KEY),
+        # compartilhado entre orquestradores (reaproveita o cliente HTTP)
+        model = get_openai_model()
 
         super().__init__(
             model=model,
@@ -72,72 +161,163 @@ class WarrantOrchestrator(CodeAgent):
             max_steps=30
         )
 
+    @staticmethod
+    def _resultado_sem_processamento(
+        session_id: str,
+        classification: InputClassification,
+        tipo_oficio: str,
+        confidence_geral: float,
+        alertas: List[str],
+        precisa_consulta_sistema: bool = False,
+        dados_para_consulta: Optional[dict] = None
+    ) -> WarrantProcessingResult:
+        """
+        Resultado dos retornos antecipados (reiteracao, nao relevante, consulta ao
+        sistema): nada foi extraido, entao investigados/subsidios/periodos vao vazios
+        """
+        return WarrantProcessingResult.model_construct(
+            session_id=session_id,
+            input_classification=classification,
+            tipo_oficio=tipo_oficio,
+            deve_processar=False,
+            investigados=[],
+            subsidios=[],
+            periodos=[],
+            precisa_consulta_sistema=precisa_consulta_sistema,
+            dados_para_consulta=dados_para_consulta,
+            confidence_geral=confidence_geral,
+            alertas=alertas
+        )
+
+    async def aprocess_warrant(self, input_text: str) -> WarrantProcessingResult:
+        """
+        Versao async de process_warrant (roda em thread para nao bloquear o loop)
+        """
+        return await asyncio.to_thread(self.process_warrant, input_text)
+
+    async def aprocess_warrants_batch(
+        self,
+        inputs: List[str],
+        batch_size: int = 8
+    ) -> List[Union[WarrantProcessingResult, Exception]]:
+        """
+        Processa varios oficios com o mesmo orquestrador (modelo, cliente HTTP e
+        caches compartilhados), no maximo batch_size ao mesmo tempo.
+        Retorna na ordem de inputs; um oficio que falhar vem como a excecao
+        levantada, sem derrubar os demais
+        """
+        semaforo = asyncio.Semaphore(batch_size)
+
+        async def _processa(input_text: str) -> WarrantProcessingResult:
+            async with semaforo:
+                return await self.aprocess_warrant(input_text)
+
+        return await asyncio.gather(
+            *[_processa(input_text) for input_text in inputs],
+            return_exceptions=True
+        )
+
+    def process_warrants_batch(
+        self,
+        inputs: List[str],
+        batch_size: int = 8
+    ) -> List[Union[WarrantProcessingResult, Exception]]:
+        """
+        Versao sincrona de aprocess_warrants_batch (reprocessamentos em lote).
+        Como process_warrant, funciona tambem com loop ja rodando (notebooks)
+        """
+        return executar_sincrono(self.aprocess_warrants_batch(inputs, batch_size=batch_size))
+
+    async def astream_warrant(self, input_text: str) -> AsyncIterator[dict]:
+        """
+        Versao em streaming de process_warrant: produz {"stage": ..., "data": ...}
+        a cada etapa concluida (classification, filtro_instituicao, parties,
+        subsidies, dates, carta_circular, de_para) e termina com stage "result",
+        cujo data e o WarrantProcessingResult completo
+        """
+        etapas = self._iter_warrant_stages(input_text)
+        while True:
+            # Cada etapa roda em thread para nao bloquear o loop
+            evento = await asyncio.to_thread(next, etapas, None)
+            if evento is None:
+                return
+            stage, data = evento
+            yield {"stage": stage, "data": data}
+
     def process_warrant(self, input_text: str) -> WarrantProcessingResult:
         """
         Processa o input completo, independente do formato
         """
-        session_id = str(uuid.uuid4())
+        for stage, data in self._iter_warrant_stages(input_text):
+            if stage == "result":
+                return data
+
+    def _iter_warrant_stages(self, input_text: str) -> Iterator[Tuple[str, Any]]:
+        """
+        Etapas do processamento como gerador de (stage, data); o ultimo evento e
+        sempre ("result", WarrantProcessingResult)
+        """
+        session_id = uuid.uuid4().hex
         alertas = []
 
         # STEP 1: Classificacao inicial
-        classification = analyze_input_structure(input_text)
+        classification = _cached_classification(input_text)
+        yield "classification", classification
 
         # STEP 2: Decisao de processamento baseado no tipo
-        if classification.tipo_oficio == "reiteracao":
+        # tipo_oficio e lido uma vez; os valores vem de literais de
+        # analyze_input_structure (ja internados), entao == resolve por identidade
+        tipo_oficio = classification.tipo_oficio
+        e_complemento = tipo_oficio == "complemento"
+
+        if tipo_oficio == "reiteracao":
             alertas.append("REITERACAO DETECTADA - Marcado para analise prioritaria")
             # Por enquanto, nao processa reiteracoes conforme requisito
-            return WarrantProcessingResult(
-                session_id=session_id,
-                input_classification=classification,
+            yield "result", self._resultado_sem_processamento(
+                session_id,
+                classification,
                 tipo_oficio="reiteracao",
-                deve_processar=False,
-                investigados=[],
-                subsidios=[],
-                periodos=[],
-                precisa_consulta_sistema=False,
-                dados_para_consulta=None,
                 confidence_geral=classification.confidence_score,
                 alertas=alertas
             )
+            return
 
         # Tratamento para oficio complementar
-        if classification.tipo_oficio == "complemento":
+        if e_complemento:
             alertas.append("OFICIO COMPLEMENTAR - Processamento adicional ao oficio anterior")
             # Processa normalmente mas com flag de complemento
 
-        # STEP 2.5: Filtro de Instituicao Financeira
-        # Verifica se o oficio e relevante para o Banco X antes de processar
-        filtro_result = filter_by_institution(input_text, nome_banco="Banco X")
-
-        if not filtro_result.e_relevante_para_banco:
-            alertas.append(f"OFICIO NAO RELEVANTE: {filtro_result.motivo}")
-            return WarrantProcessingResult(
-                session_id=session_id,
-                input_classification=classification,
-                tipo_oficio="nao_relevante",
-                deve_processar=False,
-                investigados=[],
-                subsidios=[],
-                periodos=[],
-                precisa_consulta_sistema=False,
-                dados_para_consulta=None,
-                confidence_geral=filtro_result.confidence,
-                alertas=alertas
+        # STEP 3: Extracao de conteudo relevante
+        if classification.tem_ocr_oficio or classification.tem_marcador_ocr:
+            # STEP 2.5: Filtro de Instituicao Financeira
+            # Verifica se o oficio e relevante para o Banco X antes de processar.
+            # So roda quando o texto do oficio esta presente: sem ele o caminho e a
+            # consulta ao sistema interno e o resultado do filtro nao seria usado
+            filtro_result = filter_by_institution(input_text, nome_banco="Banco X")
+            yield "filtro_instituicao", filtro_result
+
+            if not filtro_result.e_relevante_para_banco:
+                alertas.append(f"OFICIO NAO RELEVANTE: {filtro_result.motivo}")
+                yield "result", self._resultado_sem_processamento(
+                    session_id,
+                    classification,
+                    tipo_oficio="nao_relevante",
+                    confidence_geral=filtro_result.confidence,
+                    alertas=alertas
+                )
+                return
+
+            # Se relevante, log das instituicoes encontradas (status, nao alerta:
+            # vai para o log e so e formatado se o nivel DEBUG estiver ativo)
+            logger.debug(
+                "Instituicoes detectadas: %s | Tipo de sigilo: %s",
+                filtro_result.instituicoes_mencionadas,
+                filtro_result.tipo_sigilo
             )
 
-        # Se relevante, log das instituicoes encontradas
-        instituicoes_info = ", ".join([
-            f"{inst.tipo}: {inst.nome}"
-            for inst in filtro_result.instituicoes_mencionadas
-        ])
-        alertas.append(f"Instituicoes detectadas: {instituicoes_info}")
-        alertas.append(f"Tipo de sigilo: {filtro_result.tipo_sigilo}")
+            if filtro_result.tem_multiplos_destinatarios:
+                alertas.append("MULTIPLOS DESTINATARIOS - Isolado trecho para instituicao financeira")
 
-        if filtro_result.tem_multiplos_destinatarios:
-            alertas.append("MULTIPLOS DESTINATARIOS - Isolado trecho para instituicao financeira")
-
-        # STEP 3: Extracao de conteudo relevante
-        if classification.tem_ocr_oficio or classification.tem_marcador_ocr:
             # Tem o oficio (com ou sem marcador OCR), extrai o conteudo limpo
             oficio_content = extract_oficio_content(input_text, classification)
 
@@ -155,40 +335,59 @@ class WarrantOrchestrator(CodeAgent):
 
             if not minimal_info["pode_consultar_sistema"]:
                 alertas.append("Informacoes insuficientes para processamento")
-                return WarrantProcessingResult(
-                    session_id=session_id,
-                    input_classification=classification,
+                yield "result", self._resultado_sem_processamento(
+                    session_id,
+                    classification,
                     tipo_oficio="indeterminado",
-                    deve_processar=False,
-                    investigados=[],
-                    subsidios=[],
-                    periodos=[],
-                    precisa_consulta_sistema=True,
-                    dados_para_consulta=minimal_info,
                     confidence_geral=0.3,
-                    alertas=alertas
+                    alertas=alertas,
+                    precisa_consulta_sistema=True,
+                    dados_para_consulta=minimal_info
                 )
+                return
 
             # Tem dados minimos para consulta
-            return WarrantProcessingResult(
-                session_id=session_id,
-                input_classification=classification,
-                tipo_oficio=classification.tipo_oficio,
-                deve_processar=False,
-                investigados=[],
-                subsidios=[],
-                periodos=[],
-                precisa_consulta_sistema=True,
-                dados_para_consulta=minimal_info,
+            yield "result", self._resultado_sem_processamento(
+                session_id,
+                classification,
+                tipo_oficio=tipo_oficio,
                 confidence_geral=0.6,
-                alertas=["Necessaria consulta ao sistema interno para dados completos"]
+                alertas=["Necessaria consulta ao sistema interno para dados completos"],
+                precisa_consulta_sistema=True,
+                dados_para_consulta=minimal_info
             )
+            return
 
         # STEP 4: Processamento paralelo de extracao
-        # (Em producao, isso seria paralelizado de verdade)
-
-        # Extrai investigados
-        parties_result = extract_all_investigated_parties(oficio_content)
+        # Onda 1: investigados, subsidios (chamada ao LLM) e datas sao independentes
+        # e rodam ao mesmo tempo; a latencia do LLM fica escondida atras das demais.
+        # Cada uma e publicada assim que termina, na ordem de conclusao
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {
+                executor.submit(extract_all_investigated_parties, oficio_content): "parties",
+                # Extrai e faz match de subsidios (VERSAO HIBRIDA com validacao LLM)
+                # (reaproveita o LiteLLMModel do orquestrador na validacao)
+                executor.submit(
+                    _extract_subsidies_hybrid,
+                    oficio_content,
+                    self.catalog_path,
+                    use_llm_validation=True,  # SEMPRE usa LLM para maxima precisao
+                    model=self.model
+                ): "subsidies",
+                executor.submit(extract_all_dates, oficio_content): "dates"
+            }
+
+            onda1 = {}
+            for future in concurrent.futures.as_completed(futures):
+                stage = futures[future]
+                onda1[stage] = future.result()
+                yield stage, onda1[stage]
+
+        parties_result = onda1["parties"]
+        subsidies_result = onda1["subsidies"]
+        dates = onda1["dates"]
+
+        # Investigados
         if parties_result.tem_mais_investigados_possiveis:
             alertas.append("Possiveis investigados adicionais nao capturados")
 
@@ -208,66 +407,65 @@ class WarrantOrchestrator(CodeAgent):
         #         except Exception as e:
         #             ...
 
-        # Extrai e faz match de subsidios (VERSAO HIBRIDA com validacao LLM)
-        subsidies_result = extract_and_match_subsidies_hybrid(
-            oficio_content,
-            self.catalog_path,
-            use_llm_validation=True  # SEMPRE usa LLM para maxima precisao
-        )
+        # Subsidios
         if subsidies_result.subsidios_nao_identificados:
             alertas.append(f"{len(subsidies_result.subsidios_nao_identificados)} subsidios nao identificados no catalogo")
 
-        # Extrai datas/periodos
-        dates = extract_all_dates(oficio_content)
-        periodos = []
-        for date in dates:
-            if date.tipo == "periodo" or date.tipo == "especifica":
-                periodo = extract_period_from_text(date.data_original)
-                if periodo:
-                    periodos.append(periodo)
+        # Datas/periodos (o periodo ja vem calculado de extract_all_dates; datas
+        # especificas isoladas nao formam periodo)
+        periodos = [date.period for date in dates if date.period]
 
-        # Detecta Carta Circular
-        carta_result = extract_carta_circular(
+        # Onda 2: Carta Circular e DE/PARA dependem so dos subsidios (DE/PARA usa
+        # nome, texto e id, que a Carta Circular nao altera); sao so regex, entao
+        # uma varredura conjunta no proprio thread vale mais que dois workers
+        carta_result, de_para = scan_carta_and_de_para(
             oficio_content,
-            [s.nome_subsidio for s in subsidies_result.subsidios_solicitados]
+            subsidies_result.subsidios_solicitados
         )
+        yield "carta_circular", carta_result
+        yield "de_para", de_para
+
+        # Indice dos subsidios por nome (pode haver mais de um com o mesmo nome)
+        subsidios_por_nome = {}
+        for subsidio in subsidies_result.subsidios_solicitados:
+            subsidios_por_nome.setdefault(subsidio.nome_subsidio, []).append(subsidio)
+
+        # Detecta Carta Circular
         if carta_result.tem_carta_circular:
             alertas.append(f"Carta Circular detectada: {carta_result.total_cartas} referencia(s)")
-            # Atualiza subsidios com carta circular
-            for subsidio in subsidies_result.subsidios_solicitados:
-                for carta in carta_result.cartas_encontradas:
-                    if subsidio.nome_subsidio in carta.subsidios_associados:
+            # Atualiza subsidios com carta circular (a ultima carta que cita o subsidio prevalece)
+            for carta in carta_result.cartas_encontradas:
+                for nome in carta.subsidios_associados:
+                    for subsidio in subsidios_por_nome.get(nome, ()):
                         subsidio.carta_circular = f"CC {carta.numero}/{carta.ano or 'N/A'}"
 
         # Detecta DE/PARA
-        de_para = detect_de_para_requirements(
-            oficio_content,
-            [s.model_dump() for s in subsidies_result.subsidios_solicitados]
-        )
         if de_para.requer_de_para:
             alertas.append(f"DE/PARA requerido para {len(de_para.subsidios_com_de_para)} subsidios")
             # Marca subsidios com DE/PARA
+            ids_de_para = set(de_para.subsidios_com_de_para)
             for subsidio in subsidies_result.subsidios_solicitados:
-                if subsidio.subsidio_id in de_para.subsidios_com_de_para:
+                if subsidio.subsidio_id in ids_de_para:
                     subsidio.requer_de_para = True
 
-        # STEP 5: Calcula confidence geral
-        confidence_factors = [
-            classification.confidence_score,
-            1.0 if parties_result.investigados else 0.0,
-            1.0 if subsidies_result.subsidios_solicitados else 0.5,
-            min(s.similarity_score for s in subsidies_result.subsidios_solicitados) if subsidies_result.subsidios_solicitados else 0.5
-        ]
-        confidence_geral = sum(confidence_factors) / len(confidence_factors)
+        # STEP 5: Calcula confidence geral (media dos 4 fatores)
+        tem_investigados = bool(parties_result.investigados)
+        tem_subsidios = bool(subsidies_result.subsidios_solicitados)
+        min_similaridade = min((s.similarity_score for s in subsidies_result.subsidios_solicitados), default=0.5)
+
+        confidence_geral = (
+            classification.confidence_score
+            + (1.0 if tem_investigados else 0.0)
+            + (1.0 if tem_subsidios else 0.5)
+            + min_similaridade
+        ) * 0.25
 
         # STEP 6: Validacoes finais
-        if not parties_result.investigados:
+        if not tem_investigados:
             alertas.append("CRITICO: Nenhum investigado identificado")
-            confidence_geral *= 0.5
 
-        if not subsidies_result.subsidios_solicitados:
+        if not tem_subsidios:
             alertas.append("CRITICO: Nenhum subsidio identificado")
-            confidence_geral *= 0.5
 
         # CCS REMOVIDO - Ajuste de confidence baseado em CCS desabilitado
         # if parties_result.investigados and not tem_pelo_menos_um_cliente:
@@ -277,14 +475,18 @@ class WarrantOrchestrator(CodeAgent):
         #     confidence_geral *= 1.1
         #     confidence_geral = min(confidence_geral, 1.0)
 
-        # Ajuste de confidence para oficio complementar
-        if classification.tipo_oficio == "complemento":
-            confidence_geral *= 0.9  # Pequena reducao por ser complementar
+        # Penalidades numa unica multiplicacao: sem investigados, sem subsidios e
+        # pequena reducao para oficio complementar
+        confidence_geral *= (
+            (1.0 if tem_investigados else 0.5)
+            * (1.0 if tem_subsidios else 0.5)
+            * (0.9 if e_complemento else 1.0)
+        )
 
-        return WarrantProcessingResult(
+        yield "result", WarrantProcessingResult.model_construct(
             session_id=session_id,
             input_classification=classification,
-            tipo_oficio=classification.tipo_oficio,
+            tipo_oficio=tipo_oficio,
             deve_processar=True,
             investigados=parties_result.investigados,
             subsidios=subsidies_result.subsidios_solicitados,
@@ -294,3 +496,14 @@ class WarrantOrchestrator(CodeAgent):
             confidence_geral=confidence_geral,
             alertas=alertas
         )
+
+
+@functools.lru_cache(maxsize=4)
+def obter_orquestrador(catalog_path: str) -> WarrantOrchestrator:
+    """
+    Um WarrantOrchestrator por catalog_path, reaproveitado entre chamadas.
+    process_warrant nao guarda estado da chamada no orquestrador (session_id e
+    resultados sao locais), entao a mesma instancia atende chamadas seguidas e
+    concorrentes (como em aprocess_warrants_batch)
+    """
+    return WarrantOrchestrator(catalog_path)
@@ -1,21 +1,93 @@
+import asyncio
 import logging
 import concurrent.futures
+import functools
+import hashlib
 import json
+import orjson
+import os
+import random
 import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict
 import pandas as pd
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
+from scr.modulos.assincrono import executar_sincrono
+from scr.modulos.cache_local import CACHE_DIR, diretorio_cache
+
 # Configuração do logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
 
+# Parte fixa do prompt de período (persona, regras e instruções), enviada como
+# mensagem de sistema idêntica em todas as chamadas. Fica no início das mensagens
+# para o cache de prefixo do provedor aproveitá-la. O contexto (igual para todos
+# os documentos) é anexado ao fim dela, já compactado em texto; a parte variável
+# (ofício, subsídio e envolvido) vai na mensagem do usuário, do mais estável
+# (ofício) para o mais específico (subsídio, envolvido).
+PROMPT_SISTEMA_PERIODO = """
+Você analisa ofícios judiciais (texto OCR) e extrai o período de quebra de sigilo bancário pedido para UM SUBSÍDIO e UM ENVOLVIDO.
+
+## ENTRADAS
+- TEXTO DO OFÍCIO: pode citar outros subsídios e pessoas; considere só o SUBSÍDIO_IDENTIFICADO e o ENVOLVIDO.
+- SUBSÍDIO_IDENTIFICADO: ID_SUBSIDIO e Trecho (recorte do ofício onde o pedido foi achado).
+- INFORMAÇÕES SOBRE O SUBSÍDIO: descrição e termos de exemplo do catálogo.
+- ENVOLVIDO: Nome e Documento (CPF/CNPJ). Se um for NÃO IDENTIFICADO, use o outro; se ambos, análise geral.
+- CONTEXTO (ao final): apoio à interpretação.
+
+## REGRAS DO PERÍODO
+- periodo_quebra_inicio e periodo_quebra_fim; formatos de entrada variados (DD/MM/YYYY, DD-MM-YYYY, DDMMYYYY, "últimos cinco anos", "entre dezembro e janeiro de 2024").
+- Período relativo ("últimos N anos"): fim = data de criação do ofício, se houver no texto, e calcule o início; sem essa data, fim = "DATA_OFICIO".
+- Dia único: início = fim.
+- Prioridade: período específico do subsídio; senão, período geral do pedido. Confira se o período específico ou geral do envolvido é o mesmo.
+- Não encontrado: "NAO_ENCONTRADO_NO_TEXTO" no campo.
+- periodo_quebra_texto_original: trecho que comprova o período.
+
+Revise a resposta contra as regras e retorne só o JSON:
+{
+    "periodo_quebra_inicio": "DDMMYYYY",
+    "periodo_quebra_fim": "DDMMYYYY",
+    "periodo_quebra_texto_original": "Solicito a quebra de sigilo bancário dos últimos 10 anos"
+}
+"""
+
+
+def formatar_contexto(contexto) -> str:
+    """
+    Converte o contexto (DataFrame lido do JSON) em texto compacto, uma linha
+    por registro, para ir uma única vez na mensagem de sistema em vez de
+    str(DataFrame) repetido em cada prompt.
+    """
+    if isinstance(contexto, pd.DataFrame):
+        linhas = []
+        for registro in contexto.to_dict(orient="records"):
+            campos = [f"{chave}: {valor}" for chave, valor in registro.items() if pd.notna(valor)]
+            linhas.append("- " + "; ".join(campos))
+        return "\n".join(linhas)
+    return str(contexto or "")
+
+
+@functools.lru_cache(maxsize=8)
+def mensagem_sistema_periodo(contexto_str: str) -> str:
+    """Mensagem de sistema completa: instruções fixas + contexto compactado"""
+    if not contexto_str:
+        return PROMPT_SISTEMA_PERIODO
+    return f"{PROMPT_SISTEMA_PERIODO}\n## CONTEXTO\n{contexto_str}\n"
+
+
 def montar_prompt_periodo_quebra(texto_oficio: str, envolvido: dict, id_subsidio: str, 
-                                  dados_subsidio: dict, info_sub: Dict[str, any], contexto: str) -> str:
+                                  dados_subsidio: dict, info_sub: Dict[str, any]) -> str:
     """
-    Monta o prompt para extração do período de quebra de um subsídio específico.
+    Monta a parte variável do prompt (mensagem do usuário) para extração do
+    período de quebra de um subsídio específico. As regras, instruções fixas e
+    o contexto ficam na mensagem de sistema (mensagem_sistema_periodo).
     
     Args:
         texto_oficio: Texto completo do ofício
@@ -23,136 +95,564 @@ def montar_prompt_periodo_quebra(texto_oficio: str, envolvido: dict, id_subsidio
         id_subsidio: ID do subsídio sendo analisado
         dados_subsidio: Dados do subsídio (classificação já realizada)
         info_sub: Informações do catálogo para este subsídio (JSON string)
-        contexto: Contexto adicional
     """
     nome = envolvido.get("nome","")
     cpf_cnpj = envolvido.get("numero_documento_envolvido", "")
-    chave_envolvido = envolvido.get("chave_envolvido", "N/A")
     trecho = dados_subsidio.get("trecho", "")
     prompt = f"""
+## TEXTO DO OFÍCIO
+{texto_oficio}
+
+## INFORMAÇÕES SOBRE O SUBSÍDIO
+{info_sub}
+
+## SUBSÍDIO_IDENTIFICADO
+ID_SUBSIDIO: {id_subsidio} | Trecho: {trecho}
+
+## ENVOLVIDO
+Nome: {nome} | Documento: {cpf_cnpj}
+"""
+    return prompt
+
+
+def montar_prompt_periodo_oficio(texto_oficio: str, pares: list) -> str:
+    """
+    Monta a mensagem do usuário para extrair numa só chamada o período de vários
+    pares (envolvido x subsídio) do mesmo ofício: o texto do ofício vai uma vez e
+    as REGRAS do sistema são aplicadas a cada PAR.
+
+    Pares consecutivos do mesmo envolvido ficam sob um único bloco ENVOLVIDO.
+
+    Args:
+        texto_oficio: Texto completo do ofício
+        pares: Lista de (envolvido, id_subsidio, dados_subsidio, info_sub)
+    """
+    blocos = []
+    envolvido_anterior = None
+    for i, (envolvido, id_subsidio, dados_subsidio, info_sub) in enumerate(pares):
+        if envolvido is not envolvido_anterior:
+            blocos.append(f"""
+### ENVOLVIDO
+Nome: {envolvido.get("nome", "")} | Documento: {envolvido.get("numero_documento_envolvido", "")}
+""")
+            envolvido_anterior = envolvido
+        blocos.append(f"""
+#### PAR {i}
+INFORMAÇÕES SOBRE O SUBSÍDIO: {info_sub}
+SUBSÍDIO_IDENTIFICADO: ID_SUBSIDIO: {id_subsidio} | Trecho: {dados_subsidio.get("trecho", "")}
+""")
 
-        ## PERSONA
-        Você é especialista em análise de ofícios judiciais e deve interpretar o texto OCR para identificar período de quebra de subsídio solicitado.
-
-        ## OBJETIVO
-        Encontrar o período de quebra de sigilo bancário solicitado no TEXTO DO OFÍCIO considerando o ENVOLVIDO e SUBSÍDIO.
-
-        ## CONTEXTO DE OFÍCIOS E QUEBRA DE SIGILO
-        Contexto sobre conteúdo de um ofício judicial para ajudar na interpretação e reasoning:
-        {contexto}
-
-        ## Descrição do conteúdo de SUBSÍDIO IDENTIFICADO que será fornecido:
-        - ID_SUBSIDIO: nome do subsídio que será analisado;
-        - Trecho: recorte do TEXTO DO OFÍCIO que foi utilizado anteriormente para encontrar a solicitação do subsídio.
-
-        ## Descrição do conteúdo de ENVOLVIDO que será fornecido:
-        - Nome: Nome do envolvido encontrado no texto;
-        - Documento: Número do documento (pode ser CPF ou CNPJ) do envolvido encontrado no texto;
-
-        ### REGRAS PARA ENVOLVIDO:
-        - Se **Nome** estiver como NÃO IDENTIFICADO, considere para a análise no texto o **Documento**;
-        - Se **Documento** estiver como NÃO IDENTIFICADO, considere para a análise no texto o **Nome**;
-        - Se **Nome E Documento** estiver como NÃO IDENTIFICADO, faça uma análise geral.
-
-        ## Descrição do TEXTO DO OFÍCIO que será fornecido:
-        - Texto completo contendo informações de ofício judicial que deve ser analisado para encontrar o período de quebra.
-        - Pode conter um ou mais subsídios além do SUBSÍDIO_IDENTIFICADO no TEXTO DO OFÍCIO. **A interpretação deve ser feita apenas para o SUBSÍDIO_IDENTIFICADO**.
-        - Pode conter um ou mais indivíduos além do ENVOLVIDO no TEXTO DO OFÍCIO. **A interpretação deve ser feita apenas para o ENVOLVIDO**.
-
-        ## Regras sobre o PERÍODO DE QUEBRA:
-        - É composto de uma período_quebra_inicio (data inicial da solicitação de quebra de sigilo) E periodo_quebra_fim (data final da solicitação de quetbra);
-        - Pode vir em diversos formatos, como por exemplo:
-        - DD/MM/YYYY;
-        - DD-MM-YYYY;
-        - DDMMYYYY;
-        - "Últimos cinco anos";
-        - "entre dezembro e janeiro de 2024".
-        - Caso apareça um período de quebra similar/relativo ao exemplo "últimos cinco anos", considere:
-        - Se houver TEXTO DO OFÍCIO data de criação do ofício, considere ela como periodo_quebra_fim e faça o cálculo do período_quebra_inicio;
-        - Se **NÃO** houver TEXTO DO OFÍCIO data de criação do ofício, considere como periodo_quebra_fim a resposta "DATA_OFICIO".
-        - Se a solicitação for feita apenas para um dia específico, considere o periodo_quebra_inicio e periodo_quebra_fim iguais.
-
-        ## INFORMAÇÕES SOBRE O SUBSÍDIO
-        Considere a descrição e termos de exemplo para apoiar na análise e interpretação do subsídio:
-        {info_sub}
-
-        ## INSTRUÇÕES
-        1. Leia e interprete o TEXTO DO OFÍCIO:
-        {texto_oficio}
-        2. Para o ID_SUBSIDIO: {id_subsidio} | Trecho: {trecho}, responda:
-        2.1 Foi solicitado um período de quebra de sigilo bancário específico para ele?
-            2.1.1 Se sim, considere ele como o período de quebra;
-            2.1.2 Se não, há um período de quebra geral para a solicitação?
-        3. Para o ENVOLVIDO de nome {nome} e documento {cpf_cnpj}, responda:
-        3.1 Foi solicitado um período de quebra de sigilo bancário específico para ele?
-            3.1.1 Se sim, é o mesmo período encontrado para o o SUBSÍDIO_IDENTIFICADO?
-            3.1.2 Caso tenha um período de quebra geral para o envolvido, é o mesmo período de quebra encontrado para o o SUBSÍDIO_IDENTIFICADO?
-        4. Caso a data "periodo_quebra_inicio" não for encontrada, retorne no campo "periodo_quebra_inicio": "NAO_ENCONTRADO_NO_TEXTO";
-        5. Caso a data "periodo_quebra_fim" não for encontrada, retorne no campo "periodo_quebra_fim": "NAO_ENCONTRADO_NO_TEXTO";
-        6. Todas as REGRAS foram consideradas durante a análise?
-        7. Faça um reasoning e revise a resposta final.
-        8. Adicione o trecho que comprova a quebra de sigilo solicitada no campo "periodo_quebra_texto_original".
-        9. Retorne o JSON com a resposta no seguinte formato:
+    return f"""
+## TEXTO DO OFÍCIO
+{texto_oficio}
+
+## PARES A ANALISAR
+Aplique as REGRAS separadamente a cada PAR abaixo (um SUBSÍDIO_IDENTIFICADO por PAR, do ENVOLVIDO sob o qual ele aparece).
+{"".join(blocos)}
+## FORMATO DA RESPOSTA
+Em vez do JSON único do sistema, retorne um JSON com um item por PAR, no formato:
+{{
+    "periodos": [
         {{
+            "par": 0,
             "periodo_quebra_inicio": "DDMMYYYY",
             "periodo_quebra_fim": "DDMMYYYY",
             "periodo_quebra_texto_original": "Solicito a quebra de sigilo bancário dos últimos 10 anos"
         }}
+    ]
+}}
+"""
 
-        # Monta o prompt final
-        """
-    return prompt
+
+PERIODO_NAO_ENCONTRADO = {
+    "periodo_quebra_inicio": "NAO_ENCONTRADO_NO_TEXTO",
+    "periodo_quebra_fim": "NAO_ENCONTRADO_NO_TEXTO",
+    "periodo_quebra_texto_original": None,
+}
+
+
+# Cache em memória das respostas do LLM, chaveado por (modelo, mensagens, parâmetros).
+# Em reprocessamentos/depuração de prompt o mesmo pedido se repete muito; a
+# resposta repetida sai do dicionário em vez de uma nova ida ao modelo.
+# Abaixo da memória há um cache em disco (SQLite) com a mesma chave, que sobrevive
+# entre execuções de processa_todos_com_logger (ofícios com subsídios e trechos
+# repetidos entre lotes).
+LLM_CACHE_MAX_ITENS = 2048
+PERIODO_LLM_CACHE_PATH = os.getenv("PERIODO_LLM_CACHE_PATH", os.path.join(CACHE_DIR, "periodo_llm_cache.sqlite"))
+_llm_respostas_cache = OrderedDict()
+_periodo_cache_conn = None
+# Limite de segurança para a leitura em streaming das respostas JSON
+LLM_STREAM_MAX_CHARS = 20000
+_llm_respostas_lock = threading.Lock()
+
+def _chave_resposta_llm(model: str, messages: list, **kwargs) -> str:
+    payload = json.dumps({"m": model, "msgs": messages, "kw": kwargs}, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+def _get_periodo_cache() -> sqlite3.Connection:
+    """Abre (uma vez por processo) a conexão com o cache SQLite; chamar com o lock"""
+    global _periodo_cache_conn
+    if _periodo_cache_conn is None:
+        diretorio_cache(os.path.dirname(os.path.abspath(PERIODO_LLM_CACHE_PATH)))
+        _periodo_cache_conn = sqlite3.connect(PERIODO_LLM_CACHE_PATH, check_same_thread=False)
+        _periodo_cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS periodo_cache (chave TEXT PRIMARY KEY, resposta TEXT)"
+        )
+    return _periodo_cache_conn
+
+def _guardar_em_memoria(chave: str, content: str) -> None:
+    _llm_respostas_cache[chave] = content
+    if len(_llm_respostas_cache) > LLM_CACHE_MAX_ITENS:
+        _llm_respostas_cache.popitem(last=False)
+
+def _resposta_em_cache(chave: str):
+    with _llm_respostas_lock:
+        if chave in _llm_respostas_cache:
+            _llm_respostas_cache.move_to_end(chave)
+            return _llm_respostas_cache[chave]
+
+        row = _get_periodo_cache().execute(
+            "SELECT resposta FROM periodo_cache WHERE chave = ?", (chave,)
+        ).fetchone()
+        if row:
+            _guardar_em_memoria(chave, row[0])
+            return row[0]
+    return None
+
+def _guardar_resposta(chave: str, content: str) -> None:
+    with _llm_respostas_lock:
+        _guardar_em_memoria(chave, content)
+        conn = _get_periodo_cache()
+        conn.execute(
+            "INSERT OR REPLACE INTO periodo_cache (chave, resposta) VALUES (?, ?)",
+            (chave, content)
+        )
+        conn.commit()
+
+
+class _FimObjetoJson:
+    """
+    Acompanha os tokens de uma resposta em streaming e indica a posição logo
+    após o '}' que fecha o objeto JSON de nível mais externo (chaves dentro de
+    strings são ignoradas).
+    """
+    def __init__(self):
+        self.tamanho = 0
+        self.profundidade = 0
+        self.iniciou = self.em_string = self.escape = False
+
+    def alimentar(self, token: str):
+        for i, ch in enumerate(token):
+            if self.escape:
+                self.escape = False
+            elif self.em_string:
+                if ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.em_string = False
+            elif ch == '"':
+                self.em_string = True
+            elif ch == "{":
+                self.profundidade += 1
+                self.iniciou = True
+            elif ch == "}":
+                self.profundidade -= 1
+                if self.iniciou and self.profundidade == 0:
+                    fim = self.tamanho + i + 1
+                    self.tamanho += len(token)
+                    return fim
+
+        self.tamanho += len(token)
+        return None
+
+
+# Roteamento de modelo: trecho com uma ou duas datas explícitas é um caso simples
+# e vai para um modelo menor; os demais (e respostas inconclusivas do menor) vão
+# para o modelo principal
+MODELO_PERIODO = "gpt-5"
+MODELO_PERIODO_SIMPLES = os.getenv("PERIODO_MODELO_SIMPLES", "gpt-4o-mini")
+_RE_DATA_EXPLICITA = re.compile(r"\d{2}[/-]\d{2}[/-]\d{4}")
+_RE_DATA_EXPLICITA_FLEX = re.compile(r"\d{1,2}[/.-]\d{1,2}[/.-]\d{4}")
+
+
+# Intervalo explícito "DD/MM/YYYY a DD/MM/YYYY" (ou até/e/hífen entre as datas)
+_RE_INTERVALO_EXPLICITO = re.compile(
+    r"(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\s*(?:a|à|até|ate|e|-|–)\s*(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})",
+    re.IGNORECASE
+)
+
+# Período relativo "últimos N anos/meses/dias" (N em algarismos)
+_RE_ULTIMOS_N = re.compile(r"[úu]ltim[oa]s?\s+(\d{1,3})\s+(anos?|m[eê]s|meses|dias?)\b", re.IGNORECASE)
+
+
+def _periodo_relativo(trecho: str, data_oficio: str):
+    """
+    "Últimos N anos/meses/dias" sem datas explícitas no trecho: fim = data do
+    ofício (DDMMYYYY) e início calculado a partir dela.
+    """
+    if not data_oficio or not _RE_DATA_8_DIGITOS.match(data_oficio):
+        return None
+    relativos = _RE_ULTIMOS_N.findall(trecho)
+    if len(relativos) != 1:
+        return None
+
+    quantidade, unidade = int(relativos[0][0]), relativos[0][1].lower()
+    if unidade.startswith("ano"):
+        delta = relativedelta(years=quantidade)
+    elif unidade.startswith("dia"):
+        delta = relativedelta(days=quantidade)
+    else:
+        delta = relativedelta(months=quantidade)
+
+    try:
+        fim = datetime(int(data_oficio[4:]), int(data_oficio[2:4]), int(data_oficio[:2]))
+    except ValueError:
+        return None
+
+    return {
+        "periodo_quebra_inicio": (fim - delta).strftime("%d%m%Y"),
+        "periodo_quebra_fim": data_oficio,
+        "periodo_quebra_texto_original": trecho,
+    }
+
+
+def try_extract_period_deterministic(trecho: str, data_oficio: str = None):
+    """
+    Extrai o período sem LLM quando o trecho traz um único intervalo explícito
+    entre duas datas válidas (início <= fim) ou, sem nenhuma data, um único
+    "últimos N anos/meses/dias" (com a data do ofício em DDMMYYYY). Nos demais
+    casos devolve None e a tarefa segue para o LLM.
+    """
+    if not trecho:
+        return None
+
+    n_datas = len(_RE_DATA_EXPLICITA_FLEX.findall(trecho))
+    if n_datas == 0:
+        return _periodo_relativo(trecho, data_oficio)
+    if n_datas != 2:
+        return None
+
+    match = _RE_INTERVALO_EXPLICITO.search(trecho)
+    if not match:
+        return None
+
+    try:
+        d1, m1, a1, d2, m2, a2 = map(int, match.groups())
+        inicio = datetime(a1, m1, d1)
+        fim = datetime(a2, m2, d2)
+    except ValueError:
+        return None
+
+    if inicio > fim:
+        return None
+
+    return {
+        "periodo_quebra_inicio": inicio.strftime("%d%m%Y"),
+        "periodo_quebra_fim": fim.strftime("%d%m%Y"),
+        "periodo_quebra_texto_original": trecho,
+    }
+
+
+def escolher_modelo_periodo(trecho: str) -> str:
+    """Modelo para a tarefa a partir do trecho do subsídio"""
+    datas = len(_RE_DATA_EXPLICITA.findall(trecho or ""))
+    return MODELO_PERIODO_SIMPLES if 1 <= datas <= 2 else MODELO_PERIODO
+
+
+# Retentativas das chamadas ao LLM: erros transitórios (429, timeout, conexão,
+# 5xx) são refeitos com backoff exponencial e jitter; cada requisição tem timeout
+# próprio para uma chamada travada não segurar o worker indefinidamente
+LLM_TIMEOUT_S = float(os.getenv("PERIODO_LLM_TIMEOUT_S", "30"))
+LLM_MAX_TENTATIVAS = 5
+LLM_BACKOFF_MIN_S = 1.0
+LLM_BACKOFF_MAX_S = 30.0
+_ERROS_TRANSITORIOS = ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError")
+
+# Concorrência das chamadas ao LLM, ajustável por implantação. Threads (cliente
+# síncrono) ficam limitadas a LLM_MAX_THREADS: pools de centenas de threads
+# esgotam o limite do processo sem ganho de vazão
+PERIODO_CONCURRENCY = int(os.getenv("PERIODO_CONCURRENCY", "32"))
+LLM_MAX_THREADS = min(50, (os.cpu_count() or 1) * 4)
+
+
+def _erro_transitorio(erro: Exception) -> bool:
+    # Pelo nome da classe/status, sem depender do pacote do cliente (openai ou compatível)
+    status = getattr(erro, "status_code", None)
+    return (
+        type(erro).__name__ in _ERROS_TRANSITORIOS
+        or status == 429
+        or (isinstance(status, int) and status >= 500)
+    )
+
+
+def _espera_backoff(tentativa: int) -> float:
+    # Exponencial com jitter completo: uniforme em [0, min(max, min * 2^tentativa)]
+    return random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_MIN_S * 2 ** tentativa))
+
+
+# Saída estruturada (json_schema strict): o modelo só pode devolver os três campos
+# nos formatos aceitos. A validação em Python (_periodo_valido) continua como
+# rede de segurança para clientes compatíveis que não aplicam o schema.
+PERIODO_QUEBRA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "periodo_quebra_inicio": {
+            "type": "string",
+            "pattern": r"^(\d{8}|NAO_ENCONTRADO_NO_TEXTO|ULTIMOS?_?\d+_?(ANOS?|MES(ES)?|DIAS?))$"
+        },
+        "periodo_quebra_fim": {
+            "type": "string",
+            "pattern": r"^(\d{8}|NAO_ENCONTRADO_NO_TEXTO|DATA_OFICIO)$"
+        },
+        "periodo_quebra_texto_original": {"type": ["string", "null"]}
+    },
+    "required": ["periodo_quebra_inicio", "periodo_quebra_fim", "periodo_quebra_texto_original"],
+    "additionalProperties": False
+}
+
+RESPONSE_FORMAT_PERIODO = {
+    "type": "json_schema",
+    "json_schema": {"name": "periodo_quebra", "schema": PERIODO_QUEBRA_SCHEMA, "strict": True}
+}
+
+RESPONSE_FORMAT_PERIODOS_OFICIO = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "periodos_quebra_oficio",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "periodos": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"par": {"type": "integer"}, **PERIODO_QUEBRA_SCHEMA["properties"]},
+                        "required": ["par", *PERIODO_QUEBRA_SCHEMA["required"]],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["periodos"],
+            "additionalProperties": False
+        },
+        "strict": True
+    }
+}
+
+# Formatos de resposta que são um objeto JSON (lidos em streaming até o '}' final)
+RESPOSTAS_JSON = ("json_object", "json_schema")
+
+
+# Validadores da resposta do LLM (compilados uma vez)
+_RE_DATA_8_DIGITOS = re.compile(r"^\d{8}$")
+_RE_PERIODO_ULTIMOS = re.compile(r"^ULTIMOS?_?\d+_?(ANOS?|MES(ES)?|DIAS?)$", re.IGNORECASE)
+
+
+def _cliente_assincrono(client) -> bool:
+    """
+    Indica se o cliente é assíncrono. O create do AsyncOpenAI vem embrulhado
+    (required_args) e não passa em iscoroutinefunction, então o tipo é checado antes.
+    """
+    try:
+        import openai
+    except ImportError:
+        openai = None
+    if openai is not None and isinstance(client, openai.AsyncOpenAI):
+        return True
+    return asyncio.iscoroutinefunction(client.chat.completions.create)
 
 
 class PeriodExtractorLLM:
-    def __init__(self, client):
+    def __init__(self, client, contexto: str = ""):
         """
         Inicializa a classe PeriodExtractorLLM com um cliente LLM.
         Args:
-            client: Cliente LLM configurado.
+            client: Cliente LLM configurado (síncrono, ex. OpenAI, ou assíncrono,
+                ex. AsyncOpenAI; o assíncrono é usado direto no caminho async).
+            contexto: Contexto já compactado (formatar_contexto), enviado na
+                mensagem de sistema.
         """
         self.client = client
+        self.mensagem_sistema = mensagem_sistema_periodo(contexto)
+        # Chamadas por modelo (rota), para acompanhar o custo do roteamento
+        self.chamadas_por_modelo = Counter()
+        # Erros transitórios por tipo (RateLimitError separado dos demais)
+        self.erros_transitorios = Counter()
+        self._rotas_lock = threading.Lock()
+        # Cliente assíncrono (AsyncOpenAI) é chamado direto no loop; síncrono vai para thread
+        self.cliente_async = _cliente_assincrono(client)
+
+    def _registrar_erro(self, erro: Exception, tentativa: int) -> None:
+        with self._rotas_lock:
+            self.erros_transitorios[type(erro).__name__] += 1
+        if type(erro).__name__ == "RateLimitError" or getattr(erro, "status_code", None) == 429:
+            logger.warning(f"Rate limit do LLM (tentativa {tentativa + 1}/{LLM_MAX_TENTATIVAS})")
+        else:
+            logger.warning(f"Erro transitório do LLM (tentativa {tentativa + 1}/{LLM_MAX_TENTATIVAS}): {erro}")
+
+    def _create(self, **kwargs):
+        """chat.completions.create com timeout e retentativas (cliente síncrono)"""
+        for tentativa in range(LLM_MAX_TENTATIVAS):
+            try:
+                return self.client.chat.completions.create(timeout=LLM_TIMEOUT_S, **kwargs)
+            except Exception as e:
+                if not _erro_transitorio(e) or tentativa == LLM_MAX_TENTATIVAS - 1:
+                    raise
+                self._registrar_erro(e, tentativa)
+                time.sleep(_espera_backoff(tentativa))
 
-    def extract_period_from_text(self, prompt: str) -> dict[str, str]:
+    async def _acreate(self, **kwargs):
+        """Versão async de _create (cliente assíncrono)"""
+        for tentativa in range(LLM_MAX_TENTATIVAS):
+            try:
+                return await self.client.chat.completions.create(timeout=LLM_TIMEOUT_S, **kwargs)
+            except Exception as e:
+                if not _erro_transitorio(e) or tentativa == LLM_MAX_TENTATIVAS - 1:
+                    raise
+                self._registrar_erro(e, tentativa)
+                await asyncio.sleep(_espera_backoff(tentativa))
+
+    def _chat_completion(self, messages: list, model: str, interpretar, **kwargs):
         """
-        Utiliza o LLM para interpretar o texto e extrair o período de quebra de sigilo.
+        Chama o LLM e devolve interpretar(conteúdo), reaproveitando respostas já
+        obtidas para o mesmo (modelo, mensagens, parâmetros). Só vai para o cache
+        a resposta que interpretar aceita (resultado não vazio): JSON inválido ou
+        stream cortado não ficam gravados como resposta definitiva.
+        """
+        chave = _chave_resposta_llm(model, messages, **kwargs)
+        content = _resposta_em_cache(chave)
+        if content is not None:
+            return interpretar(content)
 
-        Args:
-            prompt (str): Prompt formatado para a LLM.
+        if kwargs.get("response_format", {}).get("type") in RESPOSTAS_JSON:
+            content = self._stream_json_object(messages=messages, model=model, **kwargs)
+        else:
+            response = self._create(messages=messages, model=model, **kwargs)
+            content = response.choices[0].message.content
 
-        Returns:
-            dict[str, str]: Resultado com os períodos de quebra extraídos.
+        resultado = interpretar(content)
+        if resultado:
+            _guardar_resposta(chave, content)
+        return resultado
+
+    async def _achat_completion(self, messages: list, model: str, interpretar, **kwargs):
         """
+        Versão async de _chat_completion. Com cliente síncrono a chamada vai
+        para uma thread; com cliente assíncrono fica no próprio loop, e só o
+        acesso ao cache (SQLite, com lock compartilhado) vai para uma thread.
+        """
+        if not self.cliente_async:
+            return await asyncio.to_thread(self._chat_completion, messages, model, interpretar, **kwargs)
+
+        chave = _chave_resposta_llm(model, messages, **kwargs)
+        content = await asyncio.to_thread(_resposta_em_cache, chave)
+        if content is not None:
+            return interpretar(content)
+
+        if kwargs.get("response_format", {}).get("type") in RESPOSTAS_JSON:
+            content = await self._astream_json_object(messages=messages, model=model, **kwargs)
+        else:
+            response = await self._acreate(messages=messages, model=model, **kwargs)
+            content = response.choices[0].message.content
+
+        resultado = interpretar(content)
+        if resultado:
+            await asyncio.to_thread(_guardar_resposta, chave, content)
+        return resultado
+
+    def _stream_json_object(self, messages: list, model: str, **kwargs) -> str:
+        """
+        Recebe a resposta em streaming e encerra assim que o objeto JSON de nível
+        mais externo fecha, sem esperar tokens de sobra no fim da geração.
+        """
+        stream = self._create(messages=messages, model=model, stream=True, **kwargs)
+        partes = []
+        fim = None
+        scanner = _FimObjetoJson()
+
         try:
-            # Envia o prompt para o modelo LLM
-            response = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model="gpt-5",
-                response_format={"type": "json_object"}
-            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content or ""
+                partes.append(token)
+                fim = scanner.alimentar(token)
+                if fim is not None or scanner.tamanho > LLM_STREAM_MAX_CHARS:
+                    break
+        finally:
+            stream.close()
+
+        return "".join(partes)[:fim]
+
+    async def _astream_json_object(self, messages: list, model: str, **kwargs) -> str:
+        """
+        Versão async de _stream_json_object (cliente assíncrono).
+        """
+        stream = await self._acreate(messages=messages, model=model, stream=True, **kwargs)
+        partes = []
+        fim = None
+        scanner = _FimObjetoJson()
+
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content or ""
+                partes.append(token)
+                fim = scanner.alimentar(token)
+                if fim is not None or scanner.tamanho > LLM_STREAM_MAX_CHARS:
+                    break
+        finally:
+            await stream.close()
+
+        return "".join(partes)[:fim]
+
+    def _mensagens_periodo(self, prompt: str) -> list:
+        # Sistema fixo primeiro (prefixo em cache no provedor), prompt variável depois
+        return [
+            {
+                "role": "system",
+                "content": self.mensagem_sistema
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
 
+    @staticmethod
+    def _interpretar_periodo(content: str):
+        """
+        Valida a resposta JSON do LLM; devolve None quando a resposta é inválida
+        (o chamador troca por NAO_ENCONTRADO_NO_TEXTO).
+        """
+        try:
             # Processa a resposta do LLM
-            period = json.loads(response.choices[0].message.content)
+            return PeriodExtractorLLM._periodo_valido(orjson.loads(content))
+        except Exception as e:
+            logger.error(f"Erro ao processar resposta do LLM: {e}")
+        return None
 
+    @staticmethod
+    def _periodo_valido(period: dict):
+        """
+        Resultado normalizado do período, ou None quando o formato é inesperado.
+        """
+        try:
             # Valida se as datas estão no formato esperado
             periodo_inicio = period.get("periodo_quebra_inicio", "NAO_ENCONTRADO_NO_TEXTO")
             periodo_fim = period.get("periodo_quebra_fim", "NAO_ENCONTRADO_NO_TEXTO")
             
             # Valida formato do inicio (data, período relativo ou não encontrado)
             inicio_valido = (
-                re.match(r"^\d{8}$", periodo_inicio) or
-                re.match(r"^ULTIMOS?_?\d+_?(ANOS?|MES(ES)?|DIAS?)$", periodo_inicio.upper()) or
+                _RE_DATA_8_DIGITOS.match(periodo_inicio) or
+                _RE_PERIODO_ULTIMOS.match(periodo_inicio) or
                 periodo_inicio in ["NAO_ENCONTRADO_NO_TEXTO"]
             )
             
             # Valida formato do fim
             fim_valido = (
-                re.match(r"^\d{8}$", periodo_fim) or
+                _RE_DATA_8_DIGITOS.match(periodo_fim) or
                 periodo_fim in ["NAO_ENCONTRADO_NO_TEXTO", "DATA_OFICIO"]
             )
             
@@ -167,17 +667,252 @@ class PeriodExtractorLLM:
         except Exception as e:
             logger.error(f"Erro ao processar resposta do LLM: {e}")
 
-        # Retorna "NAO ENCONTRADO NO TEXTO" em caso de erro ou resposta inválida
-        return {
-            "periodo_quebra_inicio": "NAO_ENCONTRADO_NO_TEXTO",
-            "periodo_quebra_fim": "NAO_ENCONTRADO_NO_TEXTO",
-            "periodo_quebra_texto_original": None,
-        }
+        return None
+
+    def _escalar(self, model: str, resultado: dict[str, str]) -> bool:
+        # Modelo menor sem início encontrado (ou com erro) num trecho que tem datas
+        # explícitas: a resposta é suspeita e a tarefa vai para o modelo principal
+        return model != MODELO_PERIODO and resultado["periodo_quebra_inicio"] == "NAO_ENCONTRADO_NO_TEXTO"
+
+    def _contar_rota(self, model: str) -> None:
+        with self._rotas_lock:
+            self.chamadas_por_modelo[model] += 1
+
+    def extract_period_from_text(self, prompt: str, model: str = MODELO_PERIODO) -> dict[str, str]:
+        """
+        Utiliza o LLM para interpretar o texto e extrair o período de quebra de sigilo.
+
+        Args:
+            prompt (str): Prompt formatado para a LLM.
+            model (str): Modelo da rota (escolher_modelo_periodo); respostas
+                inconclusivas do modelo menor são refeitas no MODELO_PERIODO.
+
+        Returns:
+            dict[str, str]: Resultado com os períodos de quebra extraídos.
+        """
+        self._contar_rota(model)
+        try:
+            # Envia o prompt para o modelo LLM
+            resultado = self._chat_completion(
+                messages=self._mensagens_periodo(prompt),
+                model=model,
+                interpretar=self._interpretar_periodo,
+                response_format=RESPONSE_FORMAT_PERIODO
+            ) or dict(PERIODO_NAO_ENCONTRADO)
+        except Exception as e:
+            logger.error(f"Erro ao processar resposta do LLM: {e}")
+            resultado = dict(PERIODO_NAO_ENCONTRADO)
+
+        if self._escalar(model, resultado):
+            return self.extract_period_from_text(prompt, MODELO_PERIODO)
+        return resultado
+
+    async def aextract_period_from_text(self, prompt: str, model: str = MODELO_PERIODO) -> dict[str, str]:
+        """
+        Versão async de extract_period_from_text.
+        """
+        self._contar_rota(model)
+        try:
+            resultado = await self._achat_completion(
+                messages=self._mensagens_periodo(prompt),
+                model=model,
+                interpretar=self._interpretar_periodo,
+                response_format=RESPONSE_FORMAT_PERIODO
+            ) or dict(PERIODO_NAO_ENCONTRADO)
+        except Exception as e:
+            logger.error(f"Erro ao processar resposta do LLM: {e}")
+            resultado = dict(PERIODO_NAO_ENCONTRADO)
+
+        if self._escalar(model, resultado):
+            return await self.aextract_period_from_text(prompt, MODELO_PERIODO)
+        return resultado
+
+    def _periodos_do_grupo(self, content: str, n_pares: int, model: str) -> dict:
+        """
+        Separa a resposta agrupada por PAR. Só entram pares presentes e válidos
+        (no modelo menor, também com início encontrado); os demais voltam para a
+        extração individual.
+        """
+        try:
+            itens = orjson.loads(content).get("periodos", [])
+        except Exception as e:
+            logger.error(f"Erro ao processar resposta agrupada do LLM: {e}")
+            return {}
+
+        periodos = {}
+        for item in itens:
+            if not isinstance(item, dict):
+                continue
+            par = item.get("par")
+            if not isinstance(par, int) or not 0 <= par < n_pares or par in periodos:
+                continue
+            resultado = self._periodo_valido(item)
+            if resultado is None or self._escalar(model, resultado):
+                continue
+            periodos[par] = resultado
+        return periodos
+
+    def extract_periods_oficio(self, prompt: str, n_pares: int, model: str = MODELO_PERIODO) -> dict:
+        """
+        Uma chamada ao LLM para vários pares do mesmo ofício (montar_prompt_periodo_oficio).
+
+        Returns:
+            dict: {índice do PAR: resultado} apenas com os pares resolvidos.
+        """
+        self._contar_rota(model)
+        try:
+            return self._chat_completion(
+                messages=self._mensagens_periodo(prompt),
+                model=model,
+                interpretar=lambda content: self._periodos_do_grupo(content, n_pares, model),
+                response_format=RESPONSE_FORMAT_PERIODOS_OFICIO
+            )
+        except Exception as e:
+            logger.error(f"Erro ao processar resposta agrupada do LLM: {e}")
+            return {}
+
+    async def aextract_periods_oficio(self, prompt: str, n_pares: int, model: str = MODELO_PERIODO) -> dict:
+        """
+        Versão async de extract_periods_oficio.
+        """
+        self._contar_rota(model)
+        try:
+            return await self._achat_completion(
+                messages=self._mensagens_periodo(prompt),
+                model=model,
+                interpretar=lambda content: self._periodos_do_grupo(content, n_pares, model),
+                response_format=RESPONSE_FORMAT_PERIODOS_OFICIO
+            )
+        except Exception as e:
+            logger.error(f"Erro ao processar resposta agrupada do LLM: {e}")
+            return {}
+
+    def extract_periods_batch(self, prompts: list[str], max_parallel: int = 8,
+                              modelos: list[str] = None) -> list[dict[str, str]]:
+        """
+        Extrai o período de vários prompts de uma vez, disparando as chamadas
+        ao LLM em paralelo para diluir a latência fixa de cada requisição.
+
+        Args:
+            prompts (list[str]): Prompts formatados para a LLM.
+            max_parallel (int): Máximo de requisições simultâneas.
+            modelos (list[str]): Modelo de cada prompt (padrão: MODELO_PERIODO).
+
+        Returns:
+            list[dict[str, str]]: Resultados na mesma ordem dos prompts.
+        """
+        pares = list(zip(prompts, modelos or [MODELO_PERIODO] * len(prompts)))
+        # Prompts repetidos no lote (mesmo subsídio/trecho/envolvido) vão uma vez só
+        unicos = list(dict.fromkeys(pares))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_parallel, LLM_MAX_THREADS)) as executor:
+            por_par = dict(zip(unicos, executor.map(lambda par: self.extract_period_from_text(*par), unicos)))
+        # Cópia por posição: o resultado é alterado depois (DATA_OFICIO)
+        return [dict(por_par[par]) for par in pares]
+
+    async def aextract_periods_batch(self, prompts: list[str], semaforo: asyncio.Semaphore,
+                                     modelos: list[str] = None) -> list[dict[str, str]]:
+        """
+        Versão async de extract_periods_batch. O semáforo é compartilhado entre
+        todos os documentos, limitando as requisições em voo no processo inteiro.
+        """
+        async def _extrai(prompt: str, model: str) -> dict[str, str]:
+            async with semaforo:
+                return await self.aextract_period_from_text(prompt, model)
+
+        pares = list(zip(prompts, modelos or [MODELO_PERIODO] * len(prompts)))
+        unicos = list(dict.fromkeys(pares))
+        por_par = dict(zip(unicos, await asyncio.gather(*[_extrai(*par) for par in unicos])))
+        return [dict(por_par[par]) for par in pares]
+
+
+def criar_cliente_periodo(assincrono: bool = True, max_conexoes: int = None, **kwargs):
+    """
+    Cliente OpenAI para a extração de período com pool de conexões dimensionado
+    para a concorrência do lote (PERIODO_CONCURRENCY), para as chamadas em
+    paralelo reaproveitarem conexões TCP/TLS abertas.
+
+    As retentativas ficam em PeriodExtractorLLM (_create/_acreate), então as do
+    próprio cliente são desligadas (max_retries=0) para não se multiplicarem.
+    kwargs seguem para OpenAI/AsyncOpenAI (api_key, base_url, ...).
+    """
+    import httpx
+    import openai
+
+    max_conexoes = max_conexoes or PERIODO_CONCURRENCY
+    limites = httpx.Limits(max_connections=max_conexoes, max_keepalive_connections=max_conexoes)
+    kwargs.setdefault("max_retries", 0)
+    if assincrono:
+        return openai.AsyncOpenAI(http_client=httpx.AsyncClient(limits=limites), **kwargs)
+    return openai.OpenAI(http_client=httpx.Client(limits=limites), **kwargs)
+
+
+_extratores_lock = threading.Lock()
+
+
+def obter_extrator_periodo(client, contexto: str = "") -> PeriodExtractorLLM:
+    """
+    Um PeriodExtractorLLM por (cliente, contexto), reaproveitado entre tarefas e
+    lotes: a mensagem de sistema e os contadores de rota/erros ficam compartilhados.
+
+    Os extratores ficam guardados no próprio cliente (não num cache global), então
+    somem junto com ele e com o pool de conexões; o cliente não precisa ser hashable.
+    Cliente que não aceita atributos recebe um extrator novo a cada chamada.
+    """
+    with _extratores_lock:
+        por_contexto = getattr(client, "_extratores_periodo", None)
+        if por_contexto is None:
+            por_contexto = {}
+            try:
+                client._extratores_periodo = por_contexto
+            except AttributeError:
+                pass
+        extractor = por_contexto.get(contexto)
+        if extractor is None:
+            extractor = por_contexto[contexto] = PeriodExtractorLLM(client, contexto=contexto)
+    return extractor
 
 
 ########## Funções de Processamento ##########
 
 
+def _prompt_da_tarefa(args: tuple) -> str:
+    """
+    Monta o prompt de uma tarefa (envolvido x subsídio).
+
+    Args:
+        args: Tupla com (client, texto_oficio, envolvido, id_subsidio, dados_subsidio,
+              info_sub, contexto, data_oficio)
+    """
+    (_, texto_oficio, envolvido, id_subsidio, dados_subsidio,
+     info_sub, _, _) = args
+
+    return montar_prompt_periodo_quebra(
+        texto_oficio=texto_oficio,
+        envolvido=envolvido,
+        id_subsidio=id_subsidio,
+        dados_subsidio=dados_subsidio,
+        info_sub=info_sub
+    )
+
+
+def _resultado_periodo(resultado_quebra: dict, data_oficio: str) -> dict:
+    """
+    Monta o resultado final de um subsídio a partir da resposta do LLM.
+    """
+    # Resolve datas relativas
+    periodo_fim = resultado_quebra.get("periodo_quebra_fim", "NAO_ENCONTRADO_NO_TEXTO")
+
+    # Resolve data fim se for DATA_OFICIO
+    if periodo_fim == "DATA_OFICIO":
+        resultado_quebra["periodo_quebra_fim"] = data_oficio
+
+    return {
+        "periodo_quebra_inicio": resultado_quebra.get("periodo_quebra_inicio", "NAO_ENCONTRADO_NO_TEXTO"),
+        "periodo_quebra_fim": periodo_fim,
+        "periodo_quebra_texto_original": resultado_quebra.get("periodo_quebra_texto_original"),
+    }
+
+
 def processar_subsidio_quebra(args: tuple) -> tuple:
     """
     Processa um subsídio individual de um envolvido.
@@ -190,55 +925,219 @@ def processar_subsidio_quebra(args: tuple) -> tuple:
     Returns:
         tuple: (chave_envolvido, id_subsidio, resultado_periodo)
     """
-    (client, texto_oficio, envolvido, id_subsidio, dados_subsidio, 
-     info_sub, contexto, data_oficio) = args
+    client, envolvido, id_subsidio, data_oficio = args[0], args[2], args[3], args[7]
     
     chave_envolvido = envolvido.get("chave_envolvido", "N/A")
     
-    logger.info(f"Processando: Envolvido={chave_envolvido}, Subsídio={id_subsidio}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Processando: Envolvido={chave_envolvido}, Subsídio={id_subsidio}")
     
     try:
-        # Monta o prompt específico para este envolvido+subsídio
-        prompt = montar_prompt_periodo_quebra(
-            texto_oficio=texto_oficio,
-            envolvido=envolvido,
-            id_subsidio=id_subsidio,
-            dados_subsidio=dados_subsidio,
-            info_sub=info_sub,
-            contexto=contexto
-        )
-        
-        # Extrai o período
-        period_extractor_llm = PeriodExtractorLLM(client)
-        resultado_quebra = period_extractor_llm.extract_period_from_text(prompt)
-        
-        # Resolve datas relativas
-        periodo_fim = resultado_quebra.get("periodo_quebra_fim", "NAO_ENCONTRADO_NO_TEXTO")
+        # Intervalo explícito no trecho dispensa o LLM
+        resultado_quebra = try_extract_period_deterministic(args[4].get("trecho", ""), data_oficio)
+
+        if resultado_quebra is None:
+            # Monta o prompt específico para este envolvido+subsídio
+            prompt = _prompt_da_tarefa(args)
+            
+            # Extrai o período
+            period_extractor_llm = obter_extrator_periodo(client, args[6])
+            resultado_quebra = period_extractor_llm.extract_period_from_text(prompt, _modelo_da_tarefa(args))
         
-        # Resolve data fim se for DATA_OFICIO
-        if periodo_fim == "DATA_OFICIO":
-            resultado_quebra["periodo_quebra_fim"] = data_oficio
+        resultado_final = _resultado_periodo(resultado_quebra, data_oficio)
         
-        resultado_final = {
-            "periodo_quebra_inicio": resultado_quebra.get("periodo_quebra_inicio", "NAO_ENCONTRADO_NO_TEXTO"),
-            "periodo_quebra_fim": periodo_fim,
-            "periodo_quebra_texto_original": resultado_quebra.get("periodo_quebra_texto_original"),
-        }
-        
-        logger.info(f"Concluído: Envolvido={chave_envolvido}, Subsídio={id_subsidio}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Concluído: Envolvido={chave_envolvido}, Subsídio={id_subsidio}")
         
         return (chave_envolvido, id_subsidio, resultado_final)
         
     except Exception as e:
         logger.error(f"Erro ao processar Envolvido={chave_envolvido}, Subsídio={id_subsidio}: {e}")
-        return (chave_envolvido, id_subsidio, {
-            "periodo_quebra_inicio": "NAO_ENCONTRADO_NO_TEXTO",
-            "periodo_quebra_fim": "NAO_ENCONTRADO_NO_TEXTO",
-            "periodo_quebra_texto_original": None,
-        })
+        return (chave_envolvido, id_subsidio, dict(PERIODO_NAO_ENCONTRADO))
+
+
+def processar_tarefas_em_lote(tarefas: list, client, max_parallel: int = 20) -> list:
+    """
+    Processa todas as tarefas (envolvido x subsídio) de um ofício num único lote:
+    monta todos os prompts e envia de uma vez por extract_periods_batch, em vez
+    de um extrator e uma ida ao pool por tarefa.
+
+    Returns:
+        list: (chave_envolvido, id_subsidio, resultado_periodo) na ordem das tarefas
+    """
+    # O contexto é o mesmo em todas as tarefas do lote
+    extractor = obter_extrator_periodo(client, tarefas[0][6])
+    resolvidos = _periodos_diretos(tarefas)
+
+    # Pares do ofício agrupados numa chamada por modelo; o que o grupo não
+    # resolver segue na extração individual
+    grupos = _grupos_do_oficio(tarefas, resolvidos)
+    if grupos:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_parallel, LLM_MAX_THREADS)) as executor:
+            for periodos in executor.map(lambda grupo: _extrair_grupo(extractor, tarefas, *grupo), grupos):
+                resolvidos.update(periodos)
+
+    prompts = _prompts_das_tarefas(tarefas, resolvidos)
+    respostas = []
+    if prompts:
+        respostas = extractor.extract_periods_batch(
+            list(prompts.values()), max_parallel=max_parallel,
+            modelos=[_modelo_da_tarefa(tarefas[i]) for i in prompts]
+        )
+    return _resultados_das_tarefas(tarefas, {**dict(zip(prompts.keys(), respostas)), **resolvidos})
+
+
+async def aprocessar_tarefas_em_lote(tarefas: list, extractor: PeriodExtractorLLM,
+                                     semaforo: asyncio.Semaphore) -> list:
+    """
+    Versão async de processar_tarefas_em_lote (limite de concorrência pelo semáforo).
+    """
+    resolvidos = _periodos_diretos(tarefas)
+
+    async def _grupo(model: str, indices: list) -> dict:
+        async with semaforo:
+            return await _aextrair_grupo(extractor, tarefas, model, indices)
+
+    for periodos in await asyncio.gather(*[_grupo(*grupo) for grupo in _grupos_do_oficio(tarefas, resolvidos)]):
+        resolvidos.update(periodos)
+
+    prompts = _prompts_das_tarefas(tarefas, resolvidos)
+    respostas = await extractor.aextract_periods_batch(
+        list(prompts.values()), semaforo,
+        modelos=[_modelo_da_tarefa(tarefas[i]) for i in prompts]
+    )
+    return _resultados_das_tarefas(tarefas, {**dict(zip(prompts.keys(), respostas)), **resolvidos})
 
 
-def processar_envolvidos_com_logger(row, client):
+# Máximo de pares por chamada agrupada (mantém a resposta abaixo de LLM_STREAM_MAX_CHARS)
+MAX_PARES_POR_CHAMADA = 25
+
+
+def _grupos_do_oficio(tarefas: list, resolvidos: dict) -> list:
+    """
+    Agrupa as tarefas pendentes por modelo em blocos de até MAX_PARES_POR_CHAMADA.
+    As tarefas vêm de _preparar_tarefas em sequência por envolvido, então os
+    subsídios de um envolvido ficam juntos no bloco (um só ENVOLVIDO no prompt).
+    Grupos de um par só não compensam e ficam para a extração individual.
+
+    Returns:
+        list: (modelo, índices das tarefas)
+    """
+    por_modelo = {}
+    for i, tarefa in enumerate(tarefas):
+        if i not in resolvidos:
+            por_modelo.setdefault(_modelo_da_tarefa(tarefa), []).append(i)
+
+    grupos = []
+    for model, indices in por_modelo.items():
+        for inicio in range(0, len(indices), MAX_PARES_POR_CHAMADA):
+            bloco = indices[inicio:inicio + MAX_PARES_POR_CHAMADA]
+            if len(bloco) > 1:
+                grupos.append((model, bloco))
+    return grupos
+
+
+def _prompt_do_grupo(tarefas: list, indices: list) -> str:
+    # Todas as tarefas do lote são do mesmo ofício (mesmo texto_oficio)
+    pares = [(tarefas[i][2], tarefas[i][3], tarefas[i][4], tarefas[i][5]) for i in indices]
+    return montar_prompt_periodo_oficio(tarefas[indices[0]][1], pares)
+
+
+def _extrair_grupo(extractor: PeriodExtractorLLM, tarefas: list, model: str, indices: list) -> dict:
+    """
+    Extrai um grupo numa chamada. Returns: {índice da tarefa: resultado} dos pares resolvidos
+    """
+    try:
+        prompt = _prompt_do_grupo(tarefas, indices)
+    except Exception as e:
+        logger.error(f"Erro ao montar prompt agrupado: {e}")
+        return {}
+    periodos = extractor.extract_periods_oficio(prompt, len(indices), model)
+    return {indices[par]: resultado for par, resultado in periodos.items()}
+
+
+async def _aextrair_grupo(extractor: PeriodExtractorLLM, tarefas: list, model: str, indices: list) -> dict:
+    """
+    Versão async de _extrair_grupo.
+    """
+    try:
+        prompt = _prompt_do_grupo(tarefas, indices)
+    except Exception as e:
+        logger.error(f"Erro ao montar prompt agrupado: {e}")
+        return {}
+    periodos = await extractor.aextract_periods_oficio(prompt, len(indices), model)
+    return {indices[par]: resultado for par, resultado in periodos.items()}
+
+
+def _modelo_da_tarefa(tarefa: tuple) -> str:
+    return escolher_modelo_periodo(tarefa[4].get("trecho", ""))
+
+
+def _periodos_diretos(tarefas: list) -> dict:
+    """
+    Períodos resolvidos sem LLM (intervalo explícito no trecho), por índice da tarefa.
+    """
+    diretos = {}
+    for i, tarefa in enumerate(tarefas):
+        periodo = try_extract_period_deterministic(tarefa[4].get("trecho", ""), tarefa[7])
+        if periodo is not None:
+            diretos[i] = periodo
+    if diretos:
+        logger.debug("%d de %d tarefas resolvidas sem LLM", len(diretos), len(tarefas))
+    return diretos
+
+
+def _prompts_das_tarefas(tarefas: list, ignorar: dict = None) -> dict:
+    """
+    Monta os prompts por índice da tarefa, exceto as já resolvidas (ignorar).
+    Prompts que falharem na montagem ficam de fora do lote e saem como não
+    encontrados.
+    """
+    prompts = {}
+    for i, tarefa in enumerate(tarefas):
+        if ignorar and i in ignorar:
+            continue
+        try:
+            prompts[i] = _prompt_da_tarefa(tarefa)
+        except Exception as e:
+            logger.error(f"Erro ao montar prompt: Envolvido={tarefa[2].get('chave_envolvido', 'N/A')}, "
+                         f"Subsídio={tarefa[3]}: {e}")
+    return prompts
+
+
+def _resultados_das_tarefas(tarefas: list, resposta_por_tarefa: dict) -> list:
+    resultados = []
+    for i, tarefa in enumerate(tarefas):
+        chave_envolvido = tarefa[2].get("chave_envolvido", "N/A")
+        id_subsidio = tarefa[3]
+        if i in resposta_por_tarefa:
+            resultado = _resultado_periodo(resposta_por_tarefa[i], tarefa[7])
+        else:
+            resultado = dict(PERIODO_NAO_ENCONTRADO)
+        resultados.append((chave_envolvido, id_subsidio, resultado))
+
+    return resultados
+
+
+def carregar_contexto_e_catalogo() -> tuple:
+    """
+    Lê o contexto e o catálogo de subsídios uma vez por execução (antes eram
+    lidos do disco a cada linha processada).
+
+    Returns:
+        tuple: (contexto, catalogo) com contexto em texto compacto e catalogo
+               como dict {ID_SUBSIDIO: dados}
+    """
+    # Compactado uma vez em texto para a mensagem de sistema
+    contexto = formatar_contexto(pd.read_json(f"caminho_arquiv"))
+
+    catalogo_df = pd.read_json(f"caminho_arquiv")
+    catalogo = catalogo_df["ID_SUBSIDIO"].to_dict() if "ID_SUBSIDIO" in catalogo_df else {}
+
+    return contexto, catalogo
+
+
+def processar_envolvidos_com_logger(row, client, contexto=None, catalogo=None):
     """
     Processa todos os envolvidos como isolados e adiciona logs para acompanhamento.
     Atualiza diretamente a listaSubs com os períodos de quebra extraídos.
@@ -247,21 +1146,104 @@ def processar_envolvidos_com_logger(row, client):
     Retorna lista_subs com a mesma estrutura, adicionando periodo_quebra_inicio,
     periodo_quebra_fim e periodo_quebra_texto_original em cada subsídio.
     """
+    if contexto is None or catalogo is None:
+        contexto, catalogo = carregar_contexto_e_catalogo()
+
+    envolvidos_normalizados, tarefas, destinos = _preparar_tarefas(row, client, contexto, catalogo)
+
+    # Processa todas as tarefas do ofício (todos os envolvidos) num único lote
+    resultados = processar_tarefas_em_lote(tarefas, client, max_parallel=20) if tarefas else []
+
+    return _aplicar_periodos(row, envolvidos_normalizados, resultados, destinos)
+
+
+async def aprocessar_envolvidos_com_logger(row, extractor: PeriodExtractorLLM,
+                                           semaforo: asyncio.Semaphore, contexto, catalogo: dict,
+                                           data_oficio: str = None):
+    """
+    Versão async de processar_envolvidos_com_logger. Contexto, catálogo e data
+    do ofício (DDMMYYYY) já vêm prontos; as chamadas ao LLM dividem o semáforo global.
+    """
+    row, _ = await _aprocessar_linha(row, extractor, semaforo, contexto, catalogo, data_oficio)
+    return row
+
+
+async def _aprocessar_linha(row, extractor: PeriodExtractorLLM, semaforo: asyncio.Semaphore,
+                            contexto, catalogo: dict, data_oficio: str = None) -> tuple:
+    """
+    Corpo de aprocessar_envolvidos_com_logger; devolve também o número de
+    tarefas (já deduplicadas) agendadas para a linha, para o resumo do lote.
+    """
+    envolvidos_normalizados, tarefas, destinos = _preparar_tarefas(
+        row, extractor.client, contexto, catalogo, data_oficio
+    )
+
+    resultados = await aprocessar_tarefas_em_lote(tarefas, extractor, semaforo) if tarefas else []
+
+    return _aplicar_periodos(row, envolvidos_normalizados, resultados, destinos), len(tarefas)
+
+
+_RE_DATA_ISO = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+
+def _data_oficio_ddmmaaaa(valor) -> str:
+    """
+    Data do ofício em DDMMYYYY. Timestamp/datetime e texto ISO (YYYY-MM-DD...)
+    são formatados direto; outros formatos passam por pd.to_datetime.
+    """
+    if hasattr(valor, "strftime"):
+        return valor.strftime("%d%m%Y")
+    if isinstance(valor, str):
+        iso = _RE_DATA_ISO.match(valor)
+        if iso:
+            return f"{iso[3]}{iso[2]}{iso[1]}"
+    return pd.to_datetime(valor).strftime("%d%m%Y")
+
+
+def _datas_oficio_ddmmaaaa(datas):
+    """
+    Coluna data_oficio convertida de uma vez (DDMMYYYY), não linha a linha.
+    format="mixed" interpreta cada valor por si, como a conversão por linha
+    (sem ele o formato do primeiro valor vale para a coluna toda); data
+    inválida não derruba o lote inteiro, vira NAO_ENCONTRADO_NO_TEXTO e é logada.
+    """
+    convertidas = pd.to_datetime(datas, format="mixed", errors="coerce")
+
+    invalidas = convertidas.isna() & datas.notna()
+    if invalidas.any():
+        logger.warning(
+            "data_oficio inválida em %d linha(s), usando NAO_ENCONTRADO_NO_TEXTO: %s",
+            int(invalidas.sum()), datas[invalidas].to_dict()
+        )
+
+    return convertidas.dt.strftime("%d%m%Y").fillna("NAO_ENCONTRADO_NO_TEXTO")
+
+
+def _preparar_tarefas(row, client, contexto, catalogo: dict, data_oficio: str = None) -> tuple:
+    """
+    Normaliza os envolvidos do ofício e monta as tarefas (envolvido x subsídio).
+    data_oficio (DDMMYYYY) vem convertida em lote por processa_todos_com_logger;
+    sem ela, converte a da linha.
+
+    Returns:
+        tuple: (envolvidos_normalizados, tarefas, destinos), com destinos[i] a
+               lista de dados_subsidio que recebem o resultado da tarefa i
+    """
     texto_base = row.get("texto_limpo", "")
     lista_subs = row.get("listaSubs", [{}])  # Lista de envolvidos com subsídios
-    contexto = pd.read_json(f"caminho_arquiv")
-
-    catalogo_df = pd.read_json(f"caminho_arquiv")
-    catalogo = catalogo_df.get("ID_SUBSIDIO", {})
 
-    dataoficio = row.get("data_oficio")
-    data_oficio = pd.to_datetime(dataoficio).strftime("%d%m%Y")
+    if data_oficio is None:
+        data_oficio = _data_oficio_ddmmaaaa(row.get("data_oficio"))
 
     # Normaliza os dados dos envolvidos (adiciona chave NOME|DOCUMENTO)
     envolvidos_normalizados = normalizar_dados_envolvidos(lista_subs)
 
-    # Prepara lista de tarefas (envolvido x subsídio)
-    tarefas = []
+    # Prepara as tarefas (envolvido x subsídio), uma por (chave, subsídio, trecho):
+    # envolvido repetido na listaSubs não gera outra chamada ao LLM
+    tarefas = {}
+    destinos = {}
+    # Entrada do catálogo montada uma vez por subsídio do ofício, não por tarefa
+    info_sub_cache = {}
     
     for envolvido in envolvidos_normalizados:
         # Suporta tanto "nome" quanto "nome_envolvido"
@@ -270,7 +1252,8 @@ def processar_envolvidos_com_logger(row, client):
         chave_envolvido = envolvido.get("chave_envolvido", "")
         subsidios = envolvido.get("subsidios", {})
 
-        logger.info(f"Preparando envolvido: Nome={nome}, CPF/CNPJ={cpf_cnpj}, Chave={chave_envolvido}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Preparando envolvido: Nome={nome}, CPF/CNPJ={cpf_cnpj}, Chave={chave_envolvido}")
 
         # Mesmo sem subsídios, o envolvido foi normalizado
         if not subsidios:
@@ -279,9 +1262,20 @@ def processar_envolvidos_com_logger(row, client):
         
         # Cria uma tarefa para cada subsídio do envolvido
         for id_subsidio, dados_subsidio in subsidios.items():
-            info = catalogo.get(id_subsidio, {})
-            info_sub = {"id":id_subsidio, **info}
-            print(f"entrada catálogo:{info_sub}")
+            info_sub = info_sub_cache.get(id_subsidio)
+            if info_sub is None:
+                info_sub = info_sub_cache[id_subsidio] = {"id": id_subsidio, **catalogo.get(id_subsidio, {})}
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"entrada catálogo:{info_sub}")
+
+            chave_tarefa = (
+                chave_envolvido,
+                id_subsidio,
+                hashlib.sha1(str(dados_subsidio.get("trecho", "")).encode("utf-8")).hexdigest(),
+            )
+            if chave_tarefa in tarefas:
+                destinos[chave_tarefa].append(dados_subsidio)
+                continue
             
             tarefa = (
                 client,
@@ -293,69 +1287,112 @@ def processar_envolvidos_com_logger(row, client):
                 contexto,
                 data_oficio
             )
-            tarefas.append(tarefa)
+            tarefas[chave_tarefa] = tarefa
+            destinos[chave_tarefa] = [dados_subsidio]
     
-    logger.info(f"Total de tarefas a processar: {len(tarefas)}")
-    
-    # Processa em paralelo (cada envolvido+subsídio)
-    resultados_por_envolvido = {}
-    
-    if tarefas:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            resultados = list(executor.map(processar_subsidio_quebra, tarefas))
-        
-       # Organiza resultados por envolvido
-        for chave_envolvido, id_subsidio, resultado in resultados:
-            if chave_envolvido not in resultados_por_envolvido:
-                resultados_por_envolvido[chave_envolvido] = {}
-            resultados_por_envolvido[chave_envolvido][id_subsidio] = resultado
+    logger.debug("Total de tarefas a processar: %d", len(tarefas))
 
-    # Atualiza os subsídios com os períodos de quebra extraídos
-    for envolvido in envolvidos_normalizados:
-        chave = envolvido.get("chave_envolvido")
-        subsidios = envolvido.get("subsidios", {})
-        
-        if chave in resultados_por_envolvido:
-            for id_subsidio, dados_subsidio in subsidios.items():
-                if id_subsidio in resultados_por_envolvido[chave]:
-                    resultado = resultados_por_envolvido[chave][id_subsidio]
-                    # Adiciona os campos de período diretamente no subsídio
-                    dados_subsidio["periodo_quebra_inicio"] = resultado.get(
-                        "periodo_quebra_inicio", "NAO_ENCONTRADO_NO_TEXTO"
-                    )
-                    dados_subsidio["periodo_quebra_fim"] = resultado.get(
-                        "periodo_quebra_fim", "NAO_ENCONTRADO_NO_TEXTO"
-                    )
-                    dados_subsidio["periodo_quebra_texto_original"] = resultado.get(
-                        "periodo_quebra_texto_original", None
-                    )
+    # Entradas repetidas ficam nos destinos da mesma tarefa e recebem o mesmo período
+    return envolvidos_normalizados, list(tarefas.values()), list(destinos.values())
+
+
+def _aplicar_periodos(row, envolvidos_normalizados: list, resultados: list, destinos: list):
+    """
+    Grava os períodos extraídos nos subsídios de cada envolvido e atualiza a
+    listaSubs da linha. destinos[i] traz os dados_subsidio da tarefa i
+    (montados em _preparar_tarefas), então não há segunda varredura dos envolvidos.
+    """
+    for dados_subsidios, (_, _, resultado) in zip(destinos, resultados):
+        periodo = {
+            "periodo_quebra_inicio": resultado.get("periodo_quebra_inicio", "NAO_ENCONTRADO_NO_TEXTO"),
+            "periodo_quebra_fim": resultado.get("periodo_quebra_fim", "NAO_ENCONTRADO_NO_TEXTO"),
+            "periodo_quebra_texto_original": resultado.get("periodo_quebra_texto_original", None),
+        }
+        # Adiciona os campos de período diretamente no subsídio
+        for dados_subsidio in dados_subsidios:
+            dados_subsidio.update(periodo)
 
     # Atualiza a listaSubs no retorno (mantém estrutura original + campos de período)
     row["listaSubs"] = envolvidos_normalizados
     return row
 
 
-def processa_todos_com_logger(df_temp, client):
+async def _aprocessa_todos(linhas, total: int, client, max_concurrent: int,
+                           contexto, catalogo: dict) -> list:
+    """
+    Consome linhas (row, data_oficio) sob demanda: no máximo max_concurrent
+    documentos em andamento, cada um montado só quando um worker fica livre.
+    """
+    extractor = obter_extrator_periodo(client, contexto)
+    semaforo = asyncio.Semaphore(max_concurrent)
+    if not extractor.cliente_async:
+        # Cliente síncrono: as chamadas vão para o executor padrão do loop,
+        # com até max_concurrent threads (limitado a LLM_MAX_THREADS)
+        asyncio.get_running_loop().set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(max_workers=min(max_concurrent, LLM_MAX_THREADS))
+        )
+
+    resultados = [None] * total
+    n_tarefas = [0] * total
+    pendentes = enumerate(linhas)  # iterador compartilhado entre os workers
+
+    async def _worker():
+        for i, (row, data_oficio) in pendentes:
+            resultados[i], n_tarefas[i] = await _aprocessar_linha(
+                row, extractor, semaforo, contexto, catalogo, data_oficio
+            )
+
+    await asyncio.gather(*[_worker() for _ in range(max(1, min(max_concurrent, total)))])
+
+    # Logs por tarefa ficam em DEBUG; em INFO sai só o resumo do lote, com as
+    # tarefas realmente agendadas (deduplicadas em _preparar_tarefas)
+    logger.info("batch: %d docs, %d tasks", total, sum(n_tarefas))
+    return resultados
+
+
+def processa_todos_com_logger(df_temp, client, max_concurrent: int = None):
     """
     Processa os dados em paralelo com logs e atualiza a listaSubs.
+
+    Um único loop asyncio cobre todos os documentos e todas as tarefas
+    (envolvido x subsídio); max_concurrent limita as chamadas ao LLM em voo no
+    total, em vez de um pool de threads por documento dentro de outro pool.
+    Com cliente assíncrono (AsyncOpenAI) as chamadas não ocupam threads.
+    Sem max_concurrent, usa PERIODO_CONCURRENCY.
     """
-    rows = df_temp.to_dict(orient="records")
-    
-    logger.info(f"Iniciando processamento de {len(rows)} documentos")
+    if max_concurrent is None:
+        max_concurrent = PERIODO_CONCURRENCY
+
+    datas_oficio = _datas_oficio_ddmmaaaa(df_temp["data_oficio"])
+
+    # Linhas montadas como dict sob demanda (sem to_dict(orient="records") do
+    # DataFrame inteiro); name=None mantém os nomes originais das colunas
+    colunas = list(df_temp.columns)
+    linhas = (
+        (dict(zip(colunas, valores)), data_oficio)
+        for valores, data_oficio in zip(df_temp.itertuples(index=False, name=None), datas_oficio)
+    )
     
-    def processar_row(row):
-        return processar_envolvidos_com_logger(row, client)
+    logger.info("Iniciando processamento de %d documentos", len(df_temp))
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=250) as executor:
-        resultados = list(executor.map(processar_row, rows))
+    # Contexto e catálogo são os mesmos para todos os documentos: lidos uma vez
+    contexto, catalogo = carregar_contexto_e_catalogo()
+
+    # Funciona também com loop já rodando (notebook): ver executar_sincrono
+    resultados = executar_sincrono(_aprocessa_todos(linhas, len(df_temp), client, max_concurrent, contexto, catalogo))
     
-    logger.info(f"Processamento concluído para {len(resultados)} documentos")
+    logger.info("Processamento concluído para %d documentos", len(resultados))
     
-    return pd.DataFrame(resultados)
+    # Só a listaSubs muda por linha: volta como coluna numa cópia rasa do
+    # DataFrame original (mantém índice e dtypes, sem remontar o frame)
+    df_resultado = df_temp.copy(deep=False)
+    df_resultado["listaSubs"] = [row["listaSubs"] for row in resultados]
+    return df_resultado
 
 
 
 
-# # Processar dados
-dados_processados = processa_todos_com_logger(dados, client)
-print(dados_processados)
+if __name__ == "__main__":
+    # # Processar dados
+    dados_processados = processa_todos_com_logger(dados, client)
+    print(dados_processados)
@@ -2,7 +2,7 @@
 
 import logging
 from typing import Dict, Any
-from scr.modulos.orquestrador import WarrantOrchestrator, WarrantProcessingResult
+from scr.modulos.orquestrador import WarrantProcessingResult, obter_orquestrador
 
 # Configuração de logging
 logger = logging.getLogger(__name__)
@@ -52,7 +52,7 @@ def main_processing_pipeline(input_text: str, catalog_path: str):
     """
     Pipeline principal com tratamento de todos os casos
     """
-    orchestrator = WarrantOrchestrator(catalog_path)
+    orchestrator = obter_orquestrador(catalog_path)
     result = orchestrator.process_warrant(input_text)
     
     # Decisões baseadas no resultado
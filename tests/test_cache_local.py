@@ -0,0 +1,38 @@
+import os
+import stat
+
+import pytest
+
+from scr.modulos.cache_local import arquivo_confiavel, diretorio_cache
+
+
+def test_diretorio_cache_criado_so_para_o_usuario(tmp_path):
+    caminho = diretorio_cache(str(tmp_path / "cache"))
+
+    assert stat.S_IMODE(os.stat(caminho).st_mode) == 0o700
+
+
+def test_diretorio_gravavel_por_outros_e_recusado(tmp_path):
+    caminho = tmp_path / "compartilhado"
+    caminho.mkdir()
+    caminho.chmod(0o777)
+
+    with pytest.raises(PermissionError):
+        diretorio_cache(str(caminho))
+
+
+def test_arquivo_confiavel(tmp_path):
+    dump = tmp_path / "matcher.joblib"
+    dump.write_bytes(b"")
+    dump.chmod(0o600)
+    assert arquivo_confiavel(str(dump))
+
+    # Gravável por outros, symlink ou ausente: não carrega
+    dump.chmod(0o666)
+    assert not arquivo_confiavel(str(dump))
+
+    link = tmp_path / "link.joblib"
+    link.symlink_to(dump)
+    assert not arquivo_confiavel(str(link))
+
+    assert not arquivo_confiavel(str(tmp_path / "ausente.joblib"))
@@ -0,0 +1,10 @@
+from scr.modulos.instituicao_filter import _filter_impl
+
+
+def test_texto_generico_sem_palavras_chave_assume_instituicao_financeira():
+    # Bloco único genérico, sem banco nem termo financeiro: PASSO 4 assume banco
+    resultado = _filter_impl("Encaminhe os dados de João no prazo de 10 dias.", "Banco X")
+
+    assert resultado.e_relevante_para_banco is True
+    assert resultado.confidence == 0.85
+    assert resultado.trecho_relevante_para_banco == "Encaminhe os dados de João no prazo de 10 dias."
@@ -0,0 +1,180 @@
+import asyncio
+import gc
+import json
+import weakref
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pandas as pd
+import pytest
+
+from scr.modulos import periodo
+from scr.modulos.periodo import PeriodExtractorLLM
+
+
+RESPOSTA = (
+    '{"periodo_quebra_inicio": "01012020", "periodo_quebra_fim": "31122021", '
+    '"periodo_quebra_texto_original": "de 01/01/2020 a 31/12/2021"}'
+)
+
+
+def _chunks(texto: str, tamanho: int = 16):
+    for i in range(0, len(texto), tamanho):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=texto[i:i + tamanho]))])
+
+
+class _StreamSync:
+    def __init__(self, texto):
+        self._chunks = _chunks(texto)
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        pass
+
+
+class _ClienteSync:
+    def __init__(self, texto=RESPOSTA):
+        self.chamadas = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._texto = texto
+
+    def _create(self, **kwargs):
+        self.chamadas += 1
+        return _StreamSync(self._texto)
+
+
+class _ClienteAsync:
+    """AsyncOpenAI de verdade, com o HTTP respondido por um MockTransport (SSE)"""
+
+    def __init__(self, texto=RESPOSTA):
+        self.chamadas = 0
+        self._texto = texto
+        self.client = openai.AsyncOpenAI(
+            api_key="teste",
+            base_url="http://llm.teste/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self._responder)),
+        )
+
+    def _responder(self, request):
+        self.chamadas += 1
+        eventos = [
+            "data: " + json.dumps({
+                "id": "teste",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "teste",
+                "choices": [{"index": 0, "delta": {"content": chunk.choices[0].delta.content}, "finish_reason": None}],
+            }) + "\n\n"
+            for chunk in _chunks(self._texto)
+        ]
+        eventos.append("data: [DONE]\n\n")
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content="".join(eventos).encode())
+
+
+def _cliente(fabrica, **kwargs):
+    cliente = fabrica(**kwargs)
+    return cliente, getattr(cliente, "client", cliente)
+
+
+@pytest.fixture(autouse=True)
+def cache_isolado(tmp_path, monkeypatch):
+    monkeypatch.setattr(periodo, "PERIODO_LLM_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(periodo, "_periodo_cache_conn", None)
+    monkeypatch.setattr(periodo, "_llm_respostas_cache", periodo.OrderedDict())
+
+
+@pytest.mark.parametrize("cliente, assincrono", [(_ClienteSync, False), (_ClienteAsync, True)])
+def test_aextract_period_from_text(cliente, assincrono):
+    client, llm = _cliente(cliente)
+    extractor = PeriodExtractorLLM(llm)
+
+    assert extractor.cliente_async is assincrono
+
+    resultado = asyncio.run(extractor.aextract_period_from_text("prompt de teste"))
+
+    assert resultado == {
+        "periodo_quebra_inicio": "01012020",
+        "periodo_quebra_fim": "31122021",
+        "periodo_quebra_texto_original": "de 01/01/2020 a 31/12/2021",
+    }
+    assert client.chamadas == 1
+
+
+@pytest.mark.parametrize("cliente", [_ClienteSync, _ClienteAsync])
+def test_resposta_invalida_nao_fica_em_cache(cliente):
+    client, llm = _cliente(cliente, texto='{"periodo_quebra_inicio": "01012020", "periodo_')
+    extractor = PeriodExtractorLLM(llm)
+
+    for _ in range(2):
+        resultado = asyncio.run(extractor.aextract_period_from_text("prompt truncado"))
+        assert resultado == periodo.PERIODO_NAO_ENCONTRADO
+
+    # Sem cache da resposta cortada, a segunda extração chama o LLM de novo
+    assert client.chamadas == 2
+
+
+def test_datas_oficio_em_formatos_mistos():
+    datas = pd.Series(["2024-03-15", "15/03/2024", "2024-01-02 10:00:00", pd.Timestamp("2023-05-06")])
+
+    assert list(periodo._datas_oficio_ddmmaaaa(datas)) == ["15032024", "15032024", "02012024", "06052023"]
+
+
+def test_data_oficio_invalida_e_logada(caplog):
+    datas = pd.Series(["2024-03-15", "sem data", None])
+
+    with caplog.at_level("WARNING", logger=periodo.logger.name):
+        resultado = periodo._datas_oficio_ddmmaaaa(datas)
+
+    assert list(resultado) == ["15032024", "NAO_ENCONTRADO_NO_TEXTO", "NAO_ENCONTRADO_NO_TEXTO"]
+    assert "1 linha(s)" in caplog.text
+    assert "sem data" in caplog.text
+
+
+def test_processa_todos_com_loop_rodando(monkeypatch):
+    # Como num notebook: chamada síncrona de dentro de um loop já em andamento
+    monkeypatch.setattr(periodo, "carregar_contexto_e_catalogo", lambda: ("", {}))
+    # Definida em outra célula do notebook, não no módulo
+    monkeypatch.setattr(periodo, "normalizar_dados_envolvidos", lambda lista_subs: lista_subs, raising=False)
+    df = pd.DataFrame({"texto_limpo": ["ofício"], "data_oficio": ["2024-03-15"], "listaSubs": [[]]})
+
+    async def _no_loop():
+        return periodo.processa_todos_com_logger(df, _ClienteSync())
+
+    resultado = asyncio.run(_no_loop())
+
+    assert list(resultado["listaSubs"]) == [[]]
+
+
+def test_resumo_do_lote_conta_tarefas_deduplicadas(monkeypatch, caplog):
+    monkeypatch.setattr(periodo, "carregar_contexto_e_catalogo", lambda: ("", {}))
+    monkeypatch.setattr(periodo, "normalizar_dados_envolvidos", lambda lista_subs: lista_subs, raising=False)
+    # O mesmo envolvido repetido na listaSubs: 2 subsídios na linha, 1 tarefa
+    envolvido = {"nome": "JOAO", "numero_documento_envolvido": "123", "chave_envolvido": "JOAO|123"}
+    lista_subs = [
+        {**envolvido, "subsidios": {"1": {"trecho": "extratos de 01/01/2020 a 31/12/2021"}}},
+        {**envolvido, "subsidios": {"1": {"trecho": "extratos de 01/01/2020 a 31/12/2021"}}},
+    ]
+    df = pd.DataFrame({"texto_limpo": ["ofício"], "data_oficio": ["2024-03-15"], "listaSubs": [lista_subs]})
+
+    with caplog.at_level("INFO", logger=periodo.logger.name):
+        periodo.processa_todos_com_logger(df, _ClienteSync())
+
+    assert "batch: 1 docs, 1 tasks" in caplog.text
+
+
+def test_extrator_reaproveitado_sem_prender_o_cliente():
+    client = _ClienteAsync().client
+    extractor = periodo.obter_extrator_periodo(client, "ctx")
+
+    assert periodo.obter_extrator_periodo(client, "ctx") is extractor
+    assert periodo.obter_extrator_periodo(client, "outro") is not extractor
+
+    # Sem cache global: descartado o cliente, ele e os extratores são coletados
+    ref = weakref.ref(client)
+    del client, extractor
+    gc.collect()
+    assert ref() is None